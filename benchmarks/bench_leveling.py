@@ -0,0 +1,280 @@
+"""Banc d'essai du chemin critique du système de niveaux (Level.on_message).
+
+Alimente le cog avec des messages synthétiques (modèles discord.py simulés
+localement), sans connexion à Discord, sur une base SQLite temporaire.
+
+Mesures : latence du handler (p50/p99), requêtes SQL par message (comptées
+via set_trace_callback, lots d'XP inclus ; un executemany compte une
+requête par ligne) et débit.
+
+Exemples :
+    python benchmarks/bench_leveling.py
+    python benchmarks/bench_leveling.py --messages 50000 --users 10000 --guilds 5
+    python benchmarks/bench_leveling.py --rate 500 --cooldown 60 --skew 1.1
+    python benchmarks/bench_leveling.py --preload 100000 --max-p99-ms 2 --json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ConfigManager, StartupProfiler
+from cogs.advancedleveling import Level, _migrate_file, recompute_all_levels
+
+
+# ---- Modèles discord.py simulés : seulement ce que le cog utilise ----
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.roles = []
+        self.filesize_limit = 8 * 1024 * 1024
+
+    def get_role(self, role_id):
+        return None
+
+
+class FakeMember:
+    def __init__(self, user_id, guild):
+        self.id = user_id
+        self.bot = False
+        self.guild = guild
+        self.roles = []
+        self.mention = f"<@{user_id}>"
+        self.joined_at = datetime.now() - timedelta(days=30)
+
+    async def add_roles(self, *roles):
+        pass
+
+    async def edit(self, **kwargs):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeMessage:
+    __slots__ = ("author", "guild", "channel", "content")
+
+    def __init__(self, author, channel):
+        self.author = author
+        self.guild = author.guild
+        self.channel = channel
+        self.content = "message de test"
+
+
+class FakeBot:
+    def __init__(self, guilds):
+        self.guilds = guilds
+        self.startup_profiler = StartupProfiler(False, time.perf_counter())
+        self._ready = asyncio.Event()
+
+    async def wait_until_ready(self):
+        # Jamais prêt : le classement périodique ne tourne pas pendant la mesure
+        await self._ready.wait()
+
+
+# ---- Préparation ----
+
+def write_config(path, guild_ids, cooldown):
+    with open(path, "w") as f:
+        json.dump({
+            "guilds": {str(guild_id): {"leveling": {"xp_cooldown": cooldown}} for guild_id in guild_ids}
+        }, f)
+
+
+def preload_users(db_path, guild_ids, users, count):
+    """Insère `count` profils existants (répartis sur les serveurs) avant le chargement du cog"""
+    conn = sqlite3.connect(db_path)
+    rows = (
+        (str(guild_ids[i % len(guild_ids)]), str(i % users), random.randint(0, 50000), 0,
+         datetime.now().isoformat())
+        for i in range(count)
+    )
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (guild_id, user_id, xp, level, join_date) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+    conn.close()
+    # Niveaux cohérents avec l'XP : pas de passage de niveau artificiel au premier message
+    recompute_all_levels(db_path)
+
+
+def message_stream(args, guilds, channels):
+    """Générateur de messages : `--users` auteurs par serveur, loi de Zipf de paramètre `--skew`"""
+    rng = random.Random(args.seed)
+    members = {}
+    weights = list(itertools.accumulate(1 / (rank + 1) ** args.skew for rank in range(args.users)))
+    user_ids = range(args.users)
+    for _ in range(args.messages):
+        guild = guilds[rng.randrange(len(guilds))]
+        user_id = rng.choices(user_ids, cum_weights=weights)[0]
+        member = members.get((guild.id, user_id))
+        if member is None:
+            member = members[(guild.id, user_id)] = FakeMember(user_id, guild)
+        yield FakeMessage(member, channels[guild.id])
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# ---- Mesure ----
+
+async def run(args, workdir):
+    guild_ids = [1000 + i for i in range(args.guilds)]
+    ConfigManager.PATH = os.path.join(workdir, "config.json")
+    write_config(ConfigManager.PATH, guild_ids, args.cooldown)
+    ConfigManager.reload()
+
+    db_path = os.path.join(workdir, "leveling_data.db")
+    if args.preload:
+        await _migrate_file(db_path)
+        preload_users(db_path, guild_ids, args.users, args.preload)
+
+    guilds = [FakeGuild(guild_id) for guild_id in guild_ids]
+    channels = {guild.id: FakeChannel(guild.id * 10, guild) for guild in guilds}
+    cog = Level(FakeBot(guilds))
+    cog.db_path = db_path
+    await cog.cog_load()
+
+    statements = 0
+    writes = 0
+
+    def trace(statement):
+        nonlocal statements, writes
+        statements += 1
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes += 1
+
+    await cog.conn.set_trace_callback(trace)
+
+    # Passages de niveau détectés (les annonces partent ensuite à 1 / LEVEL_UP_INTERVAL par serveur)
+    level_ups = 0
+    push = cog.level_ups.push
+
+    def count_level_up(*effect):
+        nonlocal level_ups
+        level_ups += 1
+        push(*effect)
+
+    cog.level_ups.push = count_level_up
+    latencies = []
+
+    async def handle(message):
+        start = time.perf_counter()
+        await cog.on_message(message)
+        latencies.append(time.perf_counter() - start)
+
+    try:
+        messages = message_stream(args, guilds, channels)
+        tasks = []
+        start = time.perf_counter()
+        if args.rate:
+            # Charge ouverte : un message toutes les 1/rate secondes, traité comme
+            # un événement discord.py (tâche indépendante), quel que soit le retard
+            for index, message in enumerate(messages):
+                delay = start + index / args.rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(handle(message)))
+            await asyncio.gather(*tasks)
+        else:
+            # Charge fermée : débit maximal, un message après l'autre
+            for message in messages:
+                await handle(message)
+        elapsed = time.perf_counter() - start
+
+        # Les gains encore en attente font partie du coût des messages mesurés
+        await cog.flush_xp()
+        await cog.conn.set_trace_callback(None)
+    finally:
+        await cog.cog_unload()
+
+    latencies.sort()
+    return {
+        "messages": args.messages,
+        "users": args.users,
+        "guilds": args.guilds,
+        "rate": args.rate,
+        "cooldown": args.cooldown,
+        "skew": args.skew,
+        "preload": args.preload,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_s": round(args.messages / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "max_ms": round(latencies[-1] * 1000, 4) if latencies else 0.0,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 4) if latencies else 0.0,
+        "db_statements_per_msg": round(statements / args.messages, 4),
+        "db_writes_per_msg": round(writes / args.messages, 4),
+        "level_ups": level_ups,
+        "level_ups_sent": sum(channel.sent for channel in channels.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai de Level.on_message (hors ligne)")
+    parser.add_argument("--messages", type=int, default=20000, help="nombre de messages envoyés (défaut : 20000)")
+    parser.add_argument("--users", type=int, default=1000, help="auteurs distincts par serveur (défaut : 1000)")
+    parser.add_argument("--guilds", type=int, default=1, help="nombre de serveurs (défaut : 1)")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="messages par seconde ; 0 = débit maximal, messages traités un par un (défaut)")
+    parser.add_argument("--cooldown", type=float, default=0,
+                        help="délai anti-farming en secondes (défaut : 0, chaque message donne de l'XP)")
+    parser.add_argument("--skew", type=float, default=0,
+                        help="exposant de Zipf de l'activité des auteurs ; 0 = uniforme (défaut)")
+    parser.add_argument("--preload", type=int, default=0, help="profils déjà présents en base avant la mesure")
+    parser.add_argument("--seed", type=int, default=0, help="graine du générateur (défaut : 0)")
+    parser.add_argument("--max-p99-ms", type=float, help="code de sortie 1 si la latence p99 dépasse ce seuil")
+    parser.add_argument("--json", action="store_true", help="affiche le rapport en JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory(prefix="bench-leveling-") as workdir:
+        report = asyncio.run(run(args, workdir))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"📊 {report['messages']} messages, {report['users']} auteurs x {report['guilds']} serveur(s), "
+              f"cooldown {report['cooldown']} s, débit {'max' if not report['rate'] else report['rate']}")
+        print(f"   latence   p50 {report['p50_ms']:.3f} ms  p99 {report['p99_ms']:.3f} ms  "
+              f"max {report['max_ms']:.3f} ms")
+        print(f"   débit     {report['throughput_msg_s']:.0f} messages/s ({report['elapsed_s']:.2f} s)")
+        print(f"   SQLite    {report['db_statements_per_msg']:.3f} requêtes/message "
+              f"dont {report['db_writes_per_msg']:.3f} écritures")
+        print(f"   niveaux   {report['level_ups']} passages détectés, "
+              f"{report['level_ups_sent']} annoncés pendant la mesure")
+
+    if args.max_p99_ms is not None and report["p99_ms"] > args.max_p99_ms:
+        print(f"❌ p99 {report['p99_ms']:.3f} ms > {args.max_p99_ms} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,271 +1,1142 @@
 import aiosqlite
 from discord.ext import commands, tasks
 import discord
+import argparse
+import asyncio
+import bisect
+import csv
+import gzip
+import itertools
+import json
+import logging
+import math
+import os
 import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from main import (
+    CURVE_MAX_LEVEL, CURVE_MAX_XP, CURVE_MIN_EXPONENT, ConfigManager, LevelingSettings, apply_migrations
+)
+
+# Écriture différée de l'XP gagnée par message
+XP_FLUSH_INTERVAL = 10      # secondes entre deux écritures groupées
+XP_FLUSH_THRESHOLD = 500    # nombre d'utilisateurs en attente déclenchant une écriture immédiate
+
+DAILY_REWARD_XP = 100
+DAILY_REWARD_CREDITS = 50
+
+# Colonnes modifiables par set_flag
+NOTIFICATION_FLAGS = ("notify_level_up", "notify_daily_reward")
+
+# Cache des profils utilisateurs devant get_user
+USER_CACHE_SIZE = 5000      # nombre maximal d'utilisateurs gardés en mémoire
+USER_CACHE_TTL = 300        # secondes avant de relire un profil en base
+
+# Classement matérialisé (surchargeable via la section "leveling" de config.json)
+LEADERBOARD_INTERVAL = 3600     # secondes entre deux reconstructions
+LEADERBOARD_SIZE = 1000         # entrées gardées par serveur
+LEADERBOARD_PAGE_SIZE = 10
+
+# Délai entre deux gains d'XP (par serveur, voir LevelingSettings.xp_cooldown)
+XP_COOLDOWN_CACHE_SIZE = 50000  # derniers gains gardés en mémoire
+REACTION_GRANTS_CACHE_SIZE = 50000  # (message, emoji, membre) ayant déjà rapporté de l'XP
+
+# Effets des montées de niveau (rôle + message), appliqués en file par serveur
+LEVEL_UP_INTERVAL = 0.5         # secondes entre deux effets d'un même serveur
+
+# Export / import en flux de la table users
+EXPORT_DIR = "exports"
+IMPORT_CHUNK_SIZE = 1000        # lignes par INSERT groupé (et par transaction)
+
+# Serveur des lignes antérieures à l'XP par serveur, rattachées au premier serveur où l'utilisateur est vu
+LEGACY_GUILD_ID = ""
+
+@dataclass(slots=True)
+class UserRecord:
+    """Profil décodé d'un utilisateur sur un serveur (ligne en base + gains pas encore écrits)"""
+    guild_id: str
+    user_id: str
+    xp: int = 0
+    level: int = 0
+    last_claimed_daily: str | None = None
+    last_claimed: str | None = None
+    badges: list[str] = field(default_factory=list)  # sans doublon, dans l'ordre d'obtention
+    credits: int = 0
+    messages_sent: int = 0
+    reactions_given: int = 0
+    join_date: str | None = None
+    notify_level_up: bool = True
+    notify_daily_reward: bool = True
+
+    @classmethod
+    def from_row(cls, row, badges=()):
+        return cls(
+            guild_id=row["guild_id"],
+            user_id=row["user_id"],
+            xp=row["xp"] or 0,
+            level=row["level"] or 0,
+            last_claimed_daily=row["last_claimed_daily"],
+            last_claimed=row["last_claimed"],
+            badges=list(badges),
+            credits=row["credits"] or 0,
+            messages_sent=row["messages_sent"] or 0,
+            reactions_given=row["reactions_given"] or 0,
+            join_date=row["join_date"],
+            notify_level_up=bool(row["notify_level_up"]) if row["notify_level_up"] is not None else True,
+            notify_daily_reward=bool(row["notify_daily_reward"]) if row["notify_daily_reward"] is not None else True
+        )
+
+    def add_badges(self, badges):
+        for badge in badges:
+            if badge not in self.badges:
+                self.badges.append(badge)
+
+def _min_steps(level, exponent, floor):
+    """Plus petit s >= floor tel que int(s ** exponent) >= level.
+
+    Recherche dichotomique autour de la racine flottante : le nombre d'itérations
+    reste logarithmique même quand les arrondis faussent l'estimation.
+    """
+    def reaches(steps):
+        return int(steps ** exponent) >= level
+
+    estimate = math.ceil(level ** (1 / exponent))
+    margin = (estimate >> 32) + 2
+    low, high = max(floor, estimate - margin), max(floor, estimate + margin)
+    if low > floor and reaches(low):
+        low = floor
+    while not reaches(high):
+        low, high = high + 1, high * 2
+    while low < high:
+        middle = (low + high) // 2
+        if reaches(middle):
+            high = middle
+        else:
+            low = middle + 1
+    return high
+
+class LevelCurve:
+    """Courbe d'XP précalculée : thresholds[N] est l'XP minimale du niveau N.
+
+    level_for (bisect) et xp_for (lecture directe) sont exactement inverses.
+    """
+    __slots__ = ("thresholds",)
+
+    def __init__(self, thresholds):
+        self.thresholds = tuple(thresholds)
+
+    @classmethod
+    def from_settings(cls, settings: LevelingSettings):
+        if settings.thresholds:
+            thresholds = sorted({t for t in settings.thresholds if 0 < t <= CURVE_MAX_XP})
+            return cls((0,) + tuple(thresholds[:CURVE_MAX_LEVEL]))
+        # Par défaut, reproduit exactement l'ancienne formule int((xp // base) ** exponent)
+        base, exponent = settings.curve_base, max(settings.curve_exponent, CURVE_MIN_EXPONENT)
+        thresholds = [0]
+        steps = 0
+        for level in range(1, min(settings.max_level, CURVE_MAX_LEVEL) + 1):
+            steps = _min_steps(level, exponent, steps)
+            if steps * base > CURVE_MAX_XP:
+                break  # Niveaux hors des entiers 64 bits : la courbe s'arrête au dernier représentable
+            thresholds.append(steps * base)
+        return cls(thresholds)
+
+    @property
+    def max_level(self):
+        return len(self.thresholds) - 1
+
+    def level_for(self, xp):
+        return bisect.bisect_right(self.thresholds, xp) - 1
+
+    def xp_for(self, level):
+        """XP minimale du niveau (celle du niveau maximal au-delà)"""
+        return self.thresholds[min(level, self.max_level)]
+
+def compute_levels(curve: LevelCurve, xps):
+    """Niveaux d'une colonne d'XP en une passe vectorisée (NumPy si installé, sinon bisect)"""
+    try:
+        import numpy as np
+    except ImportError:
+        return [curve.level_for(xp) for xp in xps]
+    thresholds = np.asarray(curve.thresholds, dtype=np.int64)
+    return (np.searchsorted(thresholds, np.asarray(xps, dtype=np.int64), side="right") - 1).tolist()
+
+def level_updates(curve: LevelCurve, rows):
+    """`rows` : (guild_id, user_id, xp, level) ; renvoie (level, guild_id, user_id) des niveaux à corriger"""
+    levels = compute_levels(curve, [row[2] or 0 for row in rows])
+    return [
+        (level, row[0], row[1])
+        for row, level in zip(rows, levels) if level != row[3]
+    ]
+
+def guild_curve(guild_id):
+    """Courbe configurée pour le serveur (`guild_id` sous forme de texte)"""
+    if guild_id == LEGACY_GUILD_ID:
+        return LevelCurve.from_settings(LevelingSettings())
+    return LevelCurve.from_settings(ConfigManager.settings(int(guild_id)).leveling)
+
+class UserCache:
+    """Cache LRU borné, avec expiration, des profils utilisateurs"""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (guild_id, user_id) -> (expiration, UserRecord)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Profil en cache (compté comme hit) ou None (compté comme miss)"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def peek(self, key):
+        """Profil en cache sans toucher aux compteurs ni à l'ordre LRU, pour les écritures"""
+        entry = self._entries.get(key)
+        return entry[1] if entry is not None else None
+
+    def put(self, record: UserRecord):
+        key = (record.guild_id, record.user_id)
+        self._entries[key] = (time.monotonic() + self.ttl, record)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries), "maxsize": self.maxsize,
+            "hits": self.hits, "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+class RankIndex:
+    """Positions dans le classement de chaque serveur, en O(log n).
+
+    Une liste triée des XP par serveur (recherche par bisect), tenue à jour
+    à chaque gain d'XP et reconstruite depuis la base au démarrage.
+    """
+
+    def __init__(self):
+        self._xp = {}      # guild_id -> {user_id: xp}
+        self._sorted = {}  # guild_id -> XP de tous les membres, par ordre croissant
+
+    def load(self, rows):
+        """`rows` : (guild_id, user_id, xp) ; remplace tout le contenu"""
+        self._xp.clear()
+        for guild_id, user_id, xp in rows:
+            self._xp.setdefault(guild_id, {})[user_id] = xp or 0
+        self._sorted = {guild_id: sorted(users.values()) for guild_id, users in self._xp.items()}
+
+    def add(self, guild_id, user_id, delta):
+        users = self._xp.setdefault(guild_id, {})
+        values = self._sorted.setdefault(guild_id, [])
+        old = users.get(user_id)
+        if old is not None:
+            del values[bisect.bisect_left(values, old)]
+        new = (old or 0) + delta
+        users[user_id] = new
+        bisect.insort(values, new)
+
+    def remove(self, guild_id, user_id):
+        """Retire l'utilisateur du serveur et renvoie son XP (None s'il était absent)"""
+        old = self._xp.get(guild_id, {}).pop(user_id, None)
+        if old is not None:
+            values = self._sorted[guild_id]
+            del values[bisect.bisect_left(values, old)]
+        return old
+
+    def rank(self, guild_id, user_id):
+        """(position, total) de l'utilisateur, les ex æquo partageant la même position"""
+        xp = self._xp.get(guild_id, {}).get(user_id)
+        if xp is None:
+            return None
+        values = self._sorted[guild_id]
+        return len(values) - bisect.bisect_right(values, xp) + 1, len(values)
+
+class LevelUpQueue:
+    """Effets des montées de niveau, exécutés hors du traitement des messages.
+
+    Une file par serveur, vidée par un worker démarré à la demande. Un membre déjà
+    en attente n'y figure qu'une fois : s'il gagne deux niveaux avant d'être servi,
+    un seul effet est appliqué, pour le niveau le plus haut.
+    """
+
+    def __init__(self, handler, interval=LEVEL_UP_INTERVAL):
+        self.handler = handler  # coroutine (member, channel, level)
+        self.interval = interval
+        self._pending = {}  # guild_id -> OrderedDict user_id -> (member, channel, level)
+        self._workers = {}  # guild_id -> asyncio.Task
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._pending.values())
+
+    def push(self, member, channel, level):
+        queue = self._pending.setdefault(member.guild.id, OrderedDict())
+        previous = queue.get(member.id)
+        if previous is None or level > previous[2]:
+            queue[member.id] = (member, channel, level)
+        if member.guild.id not in self._workers:
+            self._workers[member.guild.id] = asyncio.create_task(self._run(member.guild.id))
+
+    def close(self):
+        for worker in self._workers.values():
+            worker.cancel()
+        self._workers.clear()
+        self._pending.clear()
+
+    async def _run(self, guild_id):
+        queue = self._pending[guild_id]
+        try:
+            while queue:
+                user_id, effect = queue.popitem(last=False)
+                try:
+                    await self.handler(*effect)
+                except discord.HTTPException as e:
+                    if e.status != 429:
+                        logging.error(f"Erreur lors de la montée de niveau de {user_id} : {e}")
+                    else:
+                        # Limite de débit : l'effet repasse en tête (fusionné avec un éventuel plus récent)
+                        newer = queue.pop(user_id, None)
+                        queue[user_id] = newer if newer and newer[2] > effect[2] else effect
+                        queue.move_to_end(user_id, last=False)
+                        await asyncio.sleep(float(e.response.headers.get("Retry-After", 5)))
+                        continue
+                except Exception:
+                    logging.exception(f"Erreur inattendue lors de la montée de niveau de {user_id}")
+                await asyncio.sleep(self.interval)
+        finally:
+            # Aucun await entre le dernier test de la file et ce nettoyage : rien ne peut être perdu
+            if self._workers.get(guild_id) is asyncio.current_task():
+                del self._workers[guild_id]
+                if not queue:
+                    self._pending.pop(guild_id, None)
+
+class LeaderboardView(discord.ui.View):
+    """Pagination du classement matérialisé : chaque page est une lecture par clé primaire"""
+
+    def __init__(self, cog, guild_id, pages, page=0):
+        super().__init__(timeout=180)
+        self.cog = cog
+        self.guild_id = guild_id
+        self.pages = pages
+        self.page = page
+        self._update_buttons()
+
+    def _update_buttons(self):
+        self.previous.disabled = self.page <= 0
+        self.next.disabled = self.page >= self.pages - 1
+
+    async def _show(self, interaction: discord.Interaction, page):
+        self.page = max(0, min(page, self.pages - 1))
+        self._update_buttons()
+        embed = await self.cog.leaderboard_embed(self.guild_id, self.page, self.pages)
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+# ---- Schéma de leveling_data.db : étapes appliquées par apply_migrations ----
+# Chaque étape tolère une base déjà (partiellement) à jour : les bases créées
+# avant le suivi par PRAGMA user_version partent toutes de la version 0.
+
+USERS_ADDED_COLUMNS = {
+    "messages_sent": "INTEGER DEFAULT 0",
+    "reactions_given": "INTEGER DEFAULT 0",
+    "join_date": "TEXT",
+    "notify_level_up": "BOOLEAN DEFAULT TRUE",
+    "notify_daily_reward": "BOOLEAN DEFAULT TRUE",
+    "last_claimed_daily": "TEXT"
+}
+
+async def _table_columns(conn, table):
+    async with conn.execute(f"PRAGMA table_info({table})") as cursor:
+        return [row[1] for row in await cursor.fetchall()]
+
+async def _create_users(conn):
+    """v1 : table d'origine, clé user_id, avec les colonnes ajoutées au fil du temps"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            xp INTEGER,
+            level INTEGER,
+            last_claimed_daily TEXT,
+            last_claimed TEXT,
+            badges TEXT,
+            credits INTEGER DEFAULT 0,
+            messages_sent INTEGER DEFAULT 0,
+            reactions_given INTEGER DEFAULT 0,
+            join_date TEXT,
+            notify_level_up BOOLEAN DEFAULT TRUE,
+            notify_daily_reward BOOLEAN DEFAULT TRUE
+        )
+    ''')
+    columns = await _table_columns(conn, "users")
+    for column, definition in USERS_ADDED_COLUMNS.items():
+        if column not in columns:
+            await conn.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+
+async def _key_users_by_guild(conn):
+    """v2 : clé (guild_id, user_id).
+
+    Le serveur d'origine des lignes existantes est inconnu : elles sont gardées sous
+    LEGACY_GUILD_ID puis rattachées au premier serveur où l'utilisateur est vu.
+    """
+    columns = await _table_columns(conn, "users")
+    if "guild_id" in columns:
+        return
+    column_list = ", ".join(columns)
+    await conn.execute("ALTER TABLE users RENAME TO users_global")
+    await conn.execute('''
+        CREATE TABLE users (
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            xp INTEGER,
+            level INTEGER,
+            last_claimed_daily TEXT,
+            last_claimed TEXT,
+            badges TEXT,  -- obsolète : migré vers user_badges
+            credits INTEGER DEFAULT 0,
+            messages_sent INTEGER DEFAULT 0,
+            reactions_given INTEGER DEFAULT 0,
+            join_date TEXT,
+            notify_level_up BOOLEAN DEFAULT TRUE,
+            notify_daily_reward BOOLEAN DEFAULT TRUE,
+            PRIMARY KEY (guild_id, user_id)
+        )
+    ''')
+    await conn.execute(
+        f"INSERT INTO users (guild_id, {column_list}) SELECT ?, {column_list} FROM users_global",
+        (LEGACY_GUILD_ID,)
+    )
+    await conn.execute("DROP TABLE users_global")
+
+async def _normalize_badges(conn):
+    """v3 : un badge par ligne (ensemble sans doublon, « qui a ce badge » par index),
+    repris de l'ancienne colonne texte séparée par des virgules"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_badges (
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            badge TEXT NOT NULL,
+            earned_at TEXT,
+            PRIMARY KEY (guild_id, user_id, badge)
+        ) WITHOUT ROWID
+    ''')
+    await conn.execute("CREATE INDEX IF NOT EXISTS idx_user_badges_badge ON user_badges (guild_id, badge, earned_at)")
+    async with conn.execute(
+        "SELECT guild_id, user_id, badges FROM users WHERE badges IS NOT NULL AND badges != ''"
+    ) as cursor:
+        rows = await cursor.fetchall()
+    # Date d'obtention inconnue : une date fictive, antérieure à toute vraie date, qui
+    # conserve l'ordre de l'ancienne liste (ORDER BY earned_at = ordre d'obtention)
+    await conn.executemany(
+        "INSERT OR IGNORE INTO user_badges (guild_id, user_id, badge, earned_at) VALUES (?, ?, ?, ?)",
+        [
+            (guild_id, user_id, badge, f"0001-01-01T00:00:00.{index:06d}")
+            for guild_id, user_id, badges in rows
+            for index, badge in enumerate(badge for badge in badges.split(",") if badge)
+        ]
+    )
+    await conn.execute("UPDATE users SET badges = NULL WHERE badges IS NOT NULL")
+
+LEVELING_MIGRATIONS = (
+    _create_users,
+    _key_users_by_guild,
+    _normalize_badges,
+    # v4 : classements par simple parcours d'index, déjà trié, limité au serveur
+    "CREATE INDEX IF NOT EXISTS idx_users_guild_xp ON users (guild_id, xp DESC)",
+    # v5 : classement matérialisé par update_leaderboard, lu page par page
+    '''
+    CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+        guild_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        user_id TEXT NOT NULL,
+        display_name TEXT,
+        level INTEGER,
+        xp INTEGER,
+        built_at TEXT,
+        PRIMARY KEY (guild_id, position)
+    ) WITHOUT ROWID
+    ''',
+)
 
 class Level(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db_path = "leveling_data.db"
-        self.bot.loop.create_task(self.create_table())
+        self.conn = None
+        # (guild_id, user_id) -> gains pas encore écrits :
+        # {"xp", "messages_sent", "reactions_given", "level", "badges" (set), "join_date", "last_claimed"}
+        self.pending_xp = {}
+        # Lot en cours d'écriture, toujours visible par get_user jusqu'au commit
+        self.flushing_xp = {}
+        self.db_lock = asyncio.Lock()
+        # Reflète chaque écriture du cog : base + gains en attente
+        self.user_cache = UserCache()
+        # user_id des lignes globales pas encore rattachées à un serveur
+        self.legacy_users = set()
+        self.legacy_scan_done = False  # balayage des membres au premier READY seulement
+        self.rank_index = RankIndex()
+        self.curves = {}  # guild_id -> LevelCurve, oubliée quand la configuration change
+        # guild.id -> (niveaux triés, rôles correspondants), oubliés quand les rôles ou la configuration changent
+        self.level_roles = {}
+        self.level_ups = LevelUpQueue(self.apply_level_up)
+        # (guild_id, user_id) -> horodatage du dernier gain d'XP, du plus ancien au plus récent
+        self.xp_cooldowns = OrderedDict()
+        # (message_id, emoji, user_id) déjà récompensés : retirer puis remettre une réaction ne rapporte rien
+        self.reaction_grants = OrderedDict()
+        ConfigManager.subscribe("leveling", self._on_config_change)
+
+    async def cog_load(self):
+        # Connexion unique pour toute la durée de vie du cog (un seul thread aiosqlite),
+        # ouverte et préparée avant que le cog ne reçoive des événements
+        self.conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        self.conn.row_factory = aiosqlite.Row
+        await self.conn.execute("PRAGMA journal_mode=WAL")
+        await self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.bot.startup_profiler.phase("Level.migrations"):
+            await apply_migrations(self.conn, LEVELING_MIGRATIONS, "Level")
+        async with self.conn.execute("SELECT user_id FROM users WHERE guild_id = ?", (LEGACY_GUILD_ID,)) as cursor:
+            self.legacy_users = {row["user_id"] for row in await cursor.fetchall()}
+        with self.bot.startup_profiler.phase("Level.rank_index"):
+            async with self.conn.execute("SELECT guild_id, user_id, xp FROM users") as cursor:
+                self.rank_index.load(await cursor.fetchall())
+        settings = ConfigManager.load_setting("leveling", {})
+        self.leaderboard_size = settings.get("leaderboard_size", LEADERBOARD_SIZE)
+        self.update_leaderboard.change_interval(seconds=settings.get("leaderboard_interval", LEADERBOARD_INTERVAL))
         self.update_leaderboard.start()
+        self.flush_xp_loop.start()
 
-    async def create_table(self):
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id TEXT PRIMARY KEY,
-                    xp INTEGER,
-                    level INTEGER,
-                    last_claimed_daily TEXT,
-                    last_claimed TEXT,
-                    badges TEXT,
-                    credits INTEGER DEFAULT 0,
-                    messages_sent INTEGER DEFAULT 0,
-                    reactions_given INTEGER DEFAULT 0,
-                    join_date TEXT,
-                    notify_level_up BOOLEAN DEFAULT TRUE,
-                    notify_daily_reward BOOLEAN DEFAULT TRUE
-                )
-            ''')
+    async def cog_unload(self):
+        # Appelé aussi à l'arrêt du bot (Bot.close décharge les extensions)
+        ConfigManager.unsubscribe("leveling", self._on_config_change)
+        self.level_ups.close()
+        self.update_leaderboard.cancel()
+        # Un lot en cours d'écriture tient db_lock : la boucle n'est annulée qu'entre deux lots
+        async with self.db_lock:
+            self.flush_xp_loop.cancel()
+        if self.conn is not None:
+            await self.flush_xp()
+            await self.conn.close()
+            self.conn = None
 
-            # Ajouter les colonnes manquantes si elles n'existent pas
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN messages_sent INTEGER DEFAULT 0")
-            except aiosqlite.OperationalError:
-                pass
+    async def _adopt_legacy_user(self, guild_id, user_id):
+        """Rattache au serveur la ligne globale de l'utilisateur, s'il en a une (sous db_lock)"""
+        if user_id not in self.legacy_users:
+            return
+        self.legacy_users.discard(user_id)
+        for table in ("users", "user_badges"):
+            await self.conn.execute(
+                f"UPDATE {table} SET guild_id = ? WHERE guild_id = ? AND user_id = ?",
+                (guild_id, LEGACY_GUILD_ID, user_id)
+            )
+        await self.conn.commit()
+        self._move_rank(guild_id, user_id)
 
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN reactions_given INTEGER DEFAULT 0")
-            except aiosqlite.OperationalError:
-                pass
+    def _move_rank(self, guild_id, user_id):
+        xp = self.rank_index.remove(LEGACY_GUILD_ID, user_id)
+        if xp is not None:
+            self.rank_index.add(guild_id, user_id, xp)
 
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN join_date TEXT")
-            except aiosqlite.OperationalError:
-                pass
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Rattache en une fois les lignes globales des membres déjà présents sur un serveur.
 
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN notify_level_up BOOLEAN DEFAULT TRUE")
-            except aiosqlite.OperationalError:
-                pass
+        Une seule fois par processus (pas à chaque reconnexion) ; les autres lignes
+        sont rattachées à la volée par get_user.
+        """
+        if self.legacy_scan_done or not self.legacy_users:
+            return
+        self.legacy_scan_done = True
 
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN notify_daily_reward BOOLEAN DEFAULT TRUE")
-            except aiosqlite.OperationalError:
-                pass
+        # Premier serveur commun de chaque utilisateur : par serveur, on parcourt le plus
+        # petit des deux ensembles (membres ou lignes globales), en rendant la main entre deux
+        owners = {}
+        for guild in self.bot.guilds:
+            remaining = self.legacy_users.difference(owners)
+            if not remaining:
+                break
+            if len(guild.members) < len(remaining):
+                found = (str(member.id) for member in guild.members if str(member.id) in remaining)
+            else:
+                found = (user_id for user_id in remaining if guild.get_member(int(user_id)))
+            for user_id in found:
+                owners[user_id] = str(guild.id)
+            await asyncio.sleep(0)
+
+        async with self.db_lock:
+            adopted = []
+            for user_id, guild_id in owners.items():
+                # get_user a pu rattacher la ligne entre-temps
+                if user_id in self.legacy_users:
+                    adopted.append((guild_id, LEGACY_GUILD_ID, user_id))
+                    self.legacy_users.discard(user_id)
+                    self._move_rank(guild_id, user_id)
+            if adopted:
+                for table in ("users", "user_badges"):
+                    await self.conn.executemany(
+                        f"UPDATE {table} SET guild_id = ? WHERE guild_id = ? AND user_id = ?", adopted
+                    )
+                await self.conn.commit()
+                logging.info(f"✅ {len(adopted)} profils globaux rattachés à leur serveur")
+
+    async def get_user(self, guild_id, user_id):
+        """Profil (UserRecord) sur le serveur incluant l'XP pas encore écrite, ou None.
+
+        L'objet renvoyé est celui du cache : seul le cog le modifie.
+        """
+        key = (guild_id, user_id)
+        user = self.user_cache.get(key)
+        if user is not None:
+            return user
+        # La lecture ne peut pas se glisser au milieu d'une écriture groupée
+        async with self.db_lock:
+            await self._adopt_legacy_user(guild_id, user_id)
+            async with self.conn.execute(
+                "SELECT * FROM users WHERE guild_id = ? AND user_id = ?", key
+            ) as cursor:
+                row = await cursor.fetchone()
+            badges = []
+            if row is not None:
+                async with self.conn.execute(
+                    "SELECT badge FROM user_badges WHERE guild_id = ? AND user_id = ? ORDER BY earned_at",
+                    key
+                ) as cursor:
+                    badges = [badge for (badge,) in await cursor.fetchall()]
+            user = self._with_pending_xp(key, row, badges)
+            if user is not None:
+                self.user_cache.put(user)
+            return user
+
+    def _with_pending_xp(self, key, row, badges=()):
+        deltas = [d for d in (self.flushing_xp.get(key), self.pending_xp.get(key)) if d]
+        if row is None and not deltas:
+            return None
 
+        user = UserRecord.from_row(row, badges) if row else UserRecord(*key, join_date=deltas[0]["join_date"])
+        for delta in deltas:
+            user.xp += delta["xp"]
+            user.messages_sent += delta["messages_sent"]
+            user.reactions_given += delta["reactions_given"]
+            user.level = max(user.level, delta["level"])
+            user.add_badges(delta["badges"])
+            user.last_claimed = delta["last_claimed"] or user.last_claimed
+        return user
+
+    async def flush_xp(self):
+        """Écrit en une transaction les gains accumulés depuis la dernière écriture"""
+        async with self.db_lock:
+            if not self.pending_xp:
+                return
+            self.flushing_xp, self.pending_xp = self.pending_xp, {}
+            rows = [
+                (guild_id, user_id, d["xp"], d["level"], d["messages_sent"], d["reactions_given"],
+                 d["join_date"], d["last_claimed"])
+                for (guild_id, user_id), d in self.flushing_xp.items()
+            ]
+            earned_at = datetime.now().isoformat()
+            badge_rows = [
+                (guild_id, user_id, badge, earned_at)
+                for (guild_id, user_id), d in self.flushing_xp.items() for badge in d["badges"]
+            ]
+            write = asyncio.ensure_future(self._write_xp_batch(rows, badge_rows))
             try:
-                await conn.execute("ALTER TABLE users ADD COLUMN last_claimed_daily TEXT")
-            except aiosqlite.OperationalError:
-                pass
-
-            await conn.commit()
-
-    async def get_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as conn:
-            # Utiliser Row pour accéder aux colonnes par nom
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,))
-            return await cursor.fetchone()
-
-    async def insert_or_update_user(
-        self,
-        user_id,
-        xp,
-        level,
-        last_claimed_daily,
-        last_claimed,
-        badges,
-        credits,
-        messages_sent,
-        reactions_given,
-        join_date,
-        notify_level_up,
-        notify_daily_reward
-    ):
-        async with aiosqlite.connect(self.db_path) as conn:
-            await conn.execute('''
+                # Une annulation (arrêt du cog) n'interrompt pas le lot entre l'écriture et le commit
+                await asyncio.shield(write)
+            except BaseException as e:
+                if not write.done():
+                    await asyncio.wait({write})
+                if write.cancelled() or write.exception() is not None:
+                    # On remet le lot en attente pour la prochaine écriture
+                    for key, delta in self.flushing_xp.items():
+                        self._add_pending_xp(key, delta["xp"], delta["messages_sent"],
+                                             delta["level"], delta["badges"], delta["join_date"],
+                                             delta["last_claimed"], delta["reactions_given"])
+                if not isinstance(e, aiosqlite.Error):
+                    raise
+                logging.error(f"Erreur lors de l'écriture de l'XP en attente : {e}")
+            finally:
+                self.flushing_xp = {}
+
+    async def _write_xp_batch(self, rows, badge_rows):
+        """Upsert des gains et des badges en une transaction, annulée en cas d'erreur"""
+        try:
+            await self.conn.executemany('''
                 INSERT INTO users (
-                    user_id, xp, level, last_claimed_daily, last_claimed, badges,
-                    credits, messages_sent, reactions_given, join_date,
-                    notify_level_up, notify_daily_reward
+                    guild_id, user_id, xp, level, credits, messages_sent,
+                    reactions_given, join_date, last_claimed, notify_level_up, notify_daily_reward
+                )
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?, ?, TRUE, TRUE)
+                ON CONFLICT(guild_id, user_id) DO UPDATE SET
+                    xp = xp + excluded.xp,
+                    level = MAX(COALESCE(level, 0), excluded.level),
+                    messages_sent = messages_sent + excluded.messages_sent,
+                    reactions_given = reactions_given + excluded.reactions_given,
+                    join_date = COALESCE(join_date, excluded.join_date),
+                    last_claimed = COALESCE(excluded.last_claimed, last_claimed)
+            ''', rows)
+            if badge_rows:
+                await self.conn.executemany(
+                    "INSERT OR IGNORE INTO user_badges VALUES (?, ?, ?, ?)", badge_rows
+                )
+            await self.conn.commit()
+        except BaseException:
+            await self.conn.rollback()
+            raise
+
+    def _add_pending_xp(self, key, xp, messages_sent, level, badges, join_date, last_claimed=None,
+                        reactions_given=0):
+        """`key` : (guild_id, user_id) ; `badges` : badges obtenus (itérable, éventuellement vide) ;
+        `last_claimed` : date ISO du dernier gain d'XP"""
+        pending = self.pending_xp.get(key)
+        if pending is None:
+            self.pending_xp[key] = {
+                "xp": xp, "messages_sent": messages_sent, "reactions_given": reactions_given,
+                "level": level, "badges": set(badges), "join_date": join_date, "last_claimed": last_claimed
+            }
+            return
+        pending["xp"] += xp
+        pending["messages_sent"] += messages_sent
+        pending["reactions_given"] += reactions_given
+        pending["level"] = max(pending["level"], level)
+        pending["badges"].update(badges)
+        pending["join_date"] = pending["join_date"] or join_date
+        pending["last_claimed"] = last_claimed or pending["last_claimed"]
+
+    @tasks.loop(seconds=XP_FLUSH_INTERVAL)
+    async def flush_xp_loop(self):
+        await self.flush_xp()
+
+    # ---- Opérations atomiques : une seule requête, sans lecture préalable ----
+
+    async def _update_returning(self, key, query, params, then=None):
+        """`then` : (requête, paramètres), ou fonction row -> (requête, paramètres) | None,
+        exécutée dans la même transaction si la mise à jour a lieu"""
+        for attempt in range(2):
+            async with self.db_lock:
+                await self._adopt_legacy_user(*key)
+                async with self.conn.execute(query, params) as cursor:
+                    row = await cursor.fetchone()
+                follow_up = then(row) if callable(then) and row is not None else then
+                if row is not None and follow_up is not None:
+                    await self.conn.execute(*follow_up)
+                await self.conn.commit()
+            if row is not None or key not in self.pending_xp or attempt:
+                return row
+            # Nouvel utilisateur encore uniquement en mémoire : on l'écrit puis on réessaie
+            await self.flush_xp()
+
+    async def set_flag(self, guild_id, user_id, flag, value: bool):
+        """Modifie une préférence de notification ; renvoie False si l'utilisateur est inconnu"""
+        if flag not in NOTIFICATION_FLAGS:
+            raise ValueError(f"Préférence inconnue : {flag}")
+        key = (guild_id, user_id)
+        row = await self._update_returning(
+            key,
+            f"UPDATE users SET {flag} = ? WHERE guild_id = ? AND user_id = ? RETURNING {flag}",
+            (value, guild_id, user_id)
+        )
+        cached = self.user_cache.peek(key)
+        if row is not None and cached is not None:
+            setattr(cached, flag, bool(value))
+        return row is not None
+
+    async def claim_daily(self, guild_id, user_id, now: datetime = None):
+        """Accorde la récompense quotidienne : True si accordée, False si trop tôt, None si inconnu"""
+        now = now or datetime.now()
+        key = (guild_id, user_id)
+        # Courbe construite ici, sur la boucle : le niveau est calculé en Python
+        # à partir de l'XP renvoyée, puis écrit dans la même transaction
+        curve = self.curve(guild_id)
+        level = None
+
+        def write_level(row):
+            nonlocal level
+            level = max(row["level"] or 0, curve.level_for(row["xp"]))
+            if level == row["level"]:
+                return None
+            return "UPDATE users SET level = ? WHERE guild_id = ? AND user_id = ?", (level, guild_id, user_id)
+
+        row = await self._update_returning(key, '''
+            UPDATE users SET
+                xp = xp + ?,
+                credits = credits + ?,
+                last_claimed_daily = ?
+            WHERE guild_id = ? AND user_id = ?
+              AND (last_claimed_daily IS NULL OR last_claimed_daily = '' OR last_claimed_daily <= ?)
+            RETURNING xp, level
+        ''', (
+            DAILY_REWARD_XP, DAILY_REWARD_CREDITS, now.isoformat(),
+            guild_id, user_id, (now - timedelta(hours=24)).isoformat()
+        ), then=write_level)
+        if row is not None:
+            self.rank_index.add(guild_id, user_id, DAILY_REWARD_XP)
+            cached = self.user_cache.peek(key)
+            if cached is not None:
+                cached.xp += DAILY_REWARD_XP
+                cached.level = max(cached.level, level)
+                cached.credits += DAILY_REWARD_CREDITS
+                cached.last_claimed_daily = now.isoformat()
+            return True
+        # Refus : on distingue seulement maintenant « trop tôt » de « inconnu »
+        async with self.conn.execute("SELECT 1 FROM users WHERE guild_id = ? AND user_id = ?", key) as cursor:
+            return False if await cursor.fetchone() else None
+
+    async def spend_credits(self, guild_id, user_id, amount, badge=None):
+        """Retire des crédits (et ajoute éventuellement un badge) si le solde suffit.
+
+        Renvoie le solde restant, ou None si l'utilisateur est inconnu ou trop pauvre.
+        """
+        key = (guild_id, user_id)
+        award = None
+        if badge:
+            award = (
+                "INSERT OR IGNORE INTO user_badges VALUES (?, ?, ?, ?)",
+                (guild_id, user_id, badge, datetime.now().isoformat())
+            )
+        row = await self._update_returning(key, '''
+            UPDATE users SET credits = credits - ?
+            WHERE guild_id = ? AND user_id = ? AND credits >= ?
+            RETURNING credits
+        ''', (amount, guild_id, user_id, amount), then=award)
+        if row is None:
+            return None
+        cached = self.user_cache.peek(key)
+        if cached is not None:
+            cached.credits = row["credits"]
+            if badge:
+                cached.add_badges((badge,))
+        return row["credits"]
+
+    async def badge_holders(self, guild_id, badge):
+        """user_id des membres du serveur possédant le badge (lecture de idx_user_badges_badge)"""
+        await self.flush_xp()
+        async with self.conn.execute(
+            "SELECT user_id FROM user_badges WHERE guild_id = ? AND badge = ? ORDER BY earned_at",
+            (guild_id, badge)
+        ) as cursor:
+            return [user_id for (user_id,) in await cursor.fetchall()]
+
+    def _on_config_change(self, guild_id):
+        """Oublie les courbes d'XP et les rôles de niveau quand la configuration change"""
+        if guild_id is None:
+            self.curves.clear()
+            self.level_roles.clear()
+        else:
+            self.curves.pop(str(guild_id), None)
+            self.level_roles.pop(guild_id, None)
+
+    def curve(self, guild_id):
+        curve = self.curves.get(guild_id)
+        if curve is None:
+            curve = self.curves[guild_id] = guild_curve(guild_id)
+        return curve
+
+    def level_for(self, guild_id, xp):
+        return self.curve(guild_id).level_for(xp)
+
+    def xp_for(self, guild_id, level):
+        return self.curve(guild_id).xp_for(level)
+
+    async def recompute_levels(self, guild_id):
+        """Recalcule d'un coup le niveau de tous les membres après un changement de courbe.
+
+        Renvoie le nombre de niveaux modifiés, écrits en une seule transaction.
+        """
+        await self.flush_xp()
+        async with self.db_lock:
+            async with self.conn.execute(
+                "SELECT guild_id, user_id, xp, level FROM users WHERE guild_id = ?", (guild_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            updates = level_updates(self.curve(guild_id), rows)
+            if updates:
+                await self.conn.executemany(
+                    "UPDATE users SET level = ? WHERE guild_id = ? AND user_id = ?", updates
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    xp = excluded.xp,
-                    level = excluded.level,
-                    last_claimed_daily = excluded.last_claimed_daily,
-                    last_claimed = excluded.last_claimed,
-                    badges = excluded.badges,
-                    credits = excluded.credits,
-                    messages_sent = excluded.messages_sent,
-                    reactions_given = excluded.reactions_given,
-                    join_date = excluded.join_date,
-                    notify_level_up = excluded.notify_level_up,
-                    notify_daily_reward = excluded.notify_daily_reward
-            ''', (
-                user_id, xp, level, last_claimed_daily, last_claimed, badges,
-                credits, messages_sent, reactions_given, join_date,
-                notify_level_up, notify_daily_reward
-            ))
-            await conn.commit()
-
-    def calculate_level(self, xp):
-        return int((xp // 100) ** 0.55)
-
-    def calculate_xp(self, level):
-        return int((level ** 2) * 100)
+                await self.conn.commit()
+        self.user_cache.invalidate()
+        return len(updates)
 
     @commands.Cog.listener()
     async def on_message(self, message):
-        if message.author.bot:
+        if message.author.bot or message.guild is None:
             return
 
+        guild_id = str(message.guild.id)
         user_id = str(message.author.id)
-        xp_gain = random.randint(15, 25)
-        messages_sent_increment = 1
+        key = (guild_id, user_id)
+        now = time.time()
+        cooldown = ConfigManager.settings(message.guild.id).leveling.xp_cooldown
 
-        user = await self.get_user(user_id)
+        # Message dans le délai anti-farming : pas d'XP ni de lecture en base,
+        # seulement compté en mémoire (écrit avec le prochain lot)
+        last_gain = self.xp_cooldowns.get(key)
+        if last_gain is not None and now - last_gain < cooldown:
+            self._count_message(key)
+            return
+
+        # get_user inclut les gains pas encore écrits : la détection de niveau reste exacte
+        user = await self.get_user(guild_id, user_id)
         if user is None:
             join_date = message.author.joined_at.isoformat() if message.author.joined_at else datetime.now().isoformat()
-            # Création d'un nouvel utilisateur
-            await self.insert_or_update_user(
-                user_id,
-                xp_gain,                  # xp
-                0,                        # level
-                None,                     # last_claimed_daily
-                None,                     # last_claimed
-                "",                       # badges
-                0,                        # credits
-                messages_sent_increment,  # messages_sent
-                0,                        # reactions_given
-                join_date,                # join_date
-                True,                     # notify_level_up
-                True                      # notify_daily_reward
-            )
-            xp = xp_gain
-            level_current = 0
-            last_claimed_daily = None
-            last_claimed = None
-            badges = []
-            credits = 0
-            messages_sent = messages_sent_increment
-            reactions_given = 0
-            notify_level_up = True
-            notify_daily_reward = True
+            user = UserRecord(guild_id, user_id, join_date=join_date)
+            self.user_cache.put(user)
         else:
-            xp = user["xp"] + xp_gain
-            level_current = user["level"]
-            last_claimed_daily = user["last_claimed_daily"]
-            last_claimed = user["last_claimed"]
-            # On vérifie que la valeur de badges est bien une chaîne
-            badges = user["badges"].split(",") if user["badges"] and isinstance(user["badges"], str) else []
-            credits = user["credits"]
-            messages_sent = user["messages_sent"] + messages_sent_increment
-            reactions_given = user["reactions_given"]
-            join_date = user["join_date"] if user["join_date"] else datetime.now().isoformat()
-            notify_level_up = user["notify_level_up"] if user["notify_level_up"] is not None else True
-            notify_daily_reward = user["notify_daily_reward"] if user["notify_daily_reward"] is not None else True
-
-        new_level = self.calculate_level(xp)
-
-        if new_level > level_current and notify_level_up:
-            badges.append(f"Level {new_level}")
-            await self.assign_role(message.author, new_level)
-            await message.channel.send(
-                f"🎉 Félicitations {message.author.mention}, vous êtes passé au niveau **{new_level}** !"
-            )
+            join_date = datetime.now().isoformat()
+            if last_gain is None and user.last_claimed:
+                # Gain oublié par la mémoire bornée (ou antérieur au redémarrage) : relu depuis la base
+                try:
+                    last_gain = datetime.fromisoformat(user.last_claimed).timestamp()
+                except ValueError:
+                    last_gain = None
+                if last_gain is not None and now - last_gain < cooldown:
+                    self._remember_xp_gain(key, last_gain)
+                    self._count_message(key)
+                    return
 
+        xp_gain = random.randint(15, 25)
+        last_claimed = datetime.fromtimestamp(now).isoformat()
+        self._remember_xp_gain(key, now)
 
-        await self.insert_or_update_user(
-            user_id,
-            xp,
-            new_level,
-            last_claimed_daily,
-            last_claimed,
-            ",".join(badges),
-            credits,
-            messages_sent,
-            reactions_given,
-            join_date,
-            notify_level_up,
-            notify_daily_reward
-        )
+        new_level = self.level_for(guild_id, user.xp + xp_gain)
+        level_up = new_level > user.level and user.notify_level_up
+        badges = (f"Level {new_level}",) if level_up else ()
+
+        # Aucune écriture ici : le gain est accumulé puis écrit par lot,
+        # et reporté tel quel sur le profil en cache
+        self._add_pending_xp(key, xp_gain, 1, new_level, badges, join_date, last_claimed)
+        self.rank_index.add(guild_id, user_id, xp_gain)
+        user.xp += xp_gain
+        user.messages_sent += 1
+        user.last_claimed = last_claimed
+        user.level = max(user.level, new_level)
+        user.add_badges(badges)
+        if len(self.pending_xp) >= XP_FLUSH_THRESHOLD:
+            await self.flush_xp()
+
+        if level_up:
+            # Rôle et message partent en file : les appels REST ne retardent pas le message suivant
+            self.level_ups.push(message.author, message.channel, new_level)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        """Compte les réactions en mémoire : elles partent en base avec le prochain lot d'XP"""
+        if payload.guild_id is None or payload.member is None or payload.member.bot:
+            return
+        # Pas d'XP en réagissant à ses propres messages
+        if getattr(payload, "message_author_id", None) == payload.user_id:
+            return
+
+        guild_id = str(payload.guild_id)
+        user_id = str(payload.user_id)
+        key = (guild_id, user_id)
+        if user_id in self.legacy_users:
+            # Rattache la ligne globale avant qu'un lot ne crée une seconde ligne
+            await self.get_user(guild_id, user_id)
+
+        xp_gain = ConfigManager.settings(payload.guild_id).leveling.reaction_xp
+        if xp_gain and not self._first_reaction(payload):
+            xp_gain = 0  # réaction déjà récompensée : seulement comptée
+        # Aucune lecture : le niveau (et son annonce) sera recalculé au prochain message
+        user = self.user_cache.peek(key)
+        if user is not None:
+            user.reactions_given += 1
+            user.xp += xp_gain
+        joined_at = payload.member.joined_at.isoformat() if payload.member.joined_at else None
+        self._add_pending_xp(key, xp_gain, 0, 0, (), joined_at, reactions_given=1)
+        if xp_gain:
+            self.rank_index.add(guild_id, user_id, xp_gain)
+        if len(self.pending_xp) >= XP_FLUSH_THRESHOLD:
+            await self.flush_xp()
+
+    def _first_reaction(self, payload):
+        """True la première fois que ce membre met cet emoji sur ce message (mémoire bornée)"""
+        grant = (payload.message_id, str(payload.emoji), payload.user_id)
+        if grant in self.reaction_grants:
+            return False
+        self.reaction_grants[grant] = None
+        if len(self.reaction_grants) > REACTION_GRANTS_CACHE_SIZE:
+            self.reaction_grants.popitem(last=False)
+        return True
+
+    def _count_message(self, key):
+        """Compte un message sans gain d'XP (délai anti-farming en cours)"""
+        self._add_pending_xp(key, 0, 1, 0, (), datetime.now().isoformat())
+        cached = self.user_cache.peek(key)
+        if cached is not None:
+            cached.messages_sent += 1
+
+    def _remember_xp_gain(self, key, timestamp):
+        self.xp_cooldowns[key] = timestamp
+        self.xp_cooldowns.move_to_end(key)
+        if len(self.xp_cooldowns) > XP_COOLDOWN_CACHE_SIZE:
+            self.xp_cooldowns.popitem(last=False)
+
+    async def apply_level_up(self, member, channel, level):
+        await self.assign_role(member, level)
+        await channel.send(f"🎉 Félicitations {member.mention}, vous êtes passé au niveau **{level}** !")
+
+    def level_role_map(self, guild: discord.Guild):
+        """(niveaux triés, id des rôles) du serveur, construit une fois par configuration.
+
+        Les rôles nommés « Level N » restent reconnus ; les rôles configurés sont prioritaires.
+        """
+        entry = self.level_roles.get(guild.id)
+        if entry is None:
+            roles = {}
+            for role in guild.roles:
+                prefix, _, level = role.name.partition(" ")
+                if prefix == "Level" and level.isdigit():
+                    roles[int(level)] = role.id
+            roles.update(ConfigManager.settings(guild.id).leveling.level_roles)
+            levels = sorted(roles)
+            entry = self.level_roles[guild.id] = (levels, [roles[level] for level in levels])
+        return entry
 
     async def assign_role(self, member, level):
-        role_name = f"Level {level}"
-        role = discord.utils.get(member.guild.roles, name=role_name)
-        if role:
-            await member.add_roles(role)
+        """Donne les rôles des paliers atteints (<= niveau) : tous en mode cumulatif, sinon
+        seulement le plus haut. Un niveau peut sauter des paliers (montées regroupées,
+        récompense quotidienne, recalcul) : les paliers manquants sont aussi donnés."""
+        levels, role_ids = self.level_role_map(member.guild)
+        index = bisect.bisect_right(levels, level) - 1
+        if index < 0:
+            return
+
+        if not ConfigManager.settings(member.guild.id).leveling.replace_level_roles:
+            # Un seul appel pour tous les paliers manquants
+            owned = {r.id for r in member.roles}
+            missing = [
+                role for role in map(member.guild.get_role, role_ids[:index + 1])
+                if role is not None and role.id not in owned
+            ]
+            if missing:
+                await member.add_roles(*missing)
+            return
+
+        role = member.guild.get_role(role_ids[index])
+        if role is None:
+            return
+
+        # Remplacement : un seul appel qui retire les rôles des paliers précédents
+        level_role_ids = set(role_ids)
+        roles = [r for r in member.roles if not r.is_default() and (r.id not in level_role_ids or r == role)]
+        if role not in roles:
+            roles.append(role)
+        if set(roles) != set(member.roles[1:]):
+            await member.edit(roles=roles)
+
+    def _forget_level_roles(self, role):
+        self.level_roles.pop(role.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self._forget_level_roles(role)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self._forget_level_roles(after)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self._forget_level_roles(role)
+
+    @commands.hybrid_command(name="set_level_role", description="Associe un rôle à un palier de niveau")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def set_level_role(self, ctx: commands.Context, level: int, role: discord.Role = None):
+        """Sans rôle, retire le palier"""
+        level_roles = {
+            str(lvl): role_id for lvl, role_id in ConfigManager.settings(ctx.guild.id).leveling.level_roles
+        }
+        if role is None:
+            level_roles.pop(str(level), None)
+        else:
+            level_roles[str(level)] = role.id
+        ConfigManager.update_guild(ctx.guild.id, "leveling", {"level_roles": level_roles})
+        if role is None:
+            await ctx.send(f"✅ Palier du niveau {level} retiré")
+        else:
+            await ctx.send(f"✅ {role.mention} attribué à partir du niveau {level}")
+
+    @commands.hybrid_command(name="set_level_role_mode", description="Remplacer ou cumuler les rôles de niveau")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def set_level_role_mode(self, ctx: commands.Context, replace: bool):
+        ConfigManager.update_guild(ctx.guild.id, "leveling", {"replace_level_roles": replace})
+        await ctx.send(f"✅ Rôles de niveau {'remplacés' if replace else 'cumulés'} à chaque palier")
 
     @commands.hybrid_command(name="set_notifications", description="Définir les préférences de notification")
+    @commands.guild_only()
     async def set_notifications(self, ctx: commands.Context, option: str, value: bool):
+        guild_id = str(ctx.guild.id)
         user_id = str(ctx.author.id)
-        user = await self.get_user(user_id)
-        if user is None:
+        if option not in ("level_up", "daily_reward"):
+            await ctx.send("Option de notification invalide. Veuillez choisir 'level_up' ou 'daily_reward'.")
+            return
+
+        if not await self.set_flag(guild_id, user_id, f"notify_{option}", value):
             await ctx.send("Aucune donnée utilisateur trouvée.")
             return
 
         if option == "level_up":
-            await self.insert_or_update_user(
-                user_id,
-                user["xp"],
-                user["level"],
-                user["last_claimed_daily"],
-                user["last_claimed"],
-                user["badges"],
-                user["credits"],
-                user["messages_sent"],
-                user["reactions_given"],
-                user["join_date"],
-                value,                   # Mise à jour de notify_level_up
-                user["notify_daily_reward"]
-            )
             await ctx.send(f"Préférences de notification pour les niveaux mises à jour : {'activé' if value else 'désactivé'}")
-        elif option == "daily_reward":
-            await self.insert_or_update_user(
-                user_id,
-                user["xp"],
-                user["level"],
-                user["last_claimed_daily"],
-                user["last_claimed"],
-                user["badges"],
-                user["credits"],
-                user["messages_sent"],
-                user["reactions_given"],
-                user["join_date"],
-                user["notify_level_up"],
-                value                   # Mise à jour de notify_daily_reward
-            )
-            await ctx.send(f"Préférences de notification pour les récompenses quotidiennes mises à jour : {'activé' if value else 'désactivé'}")
         else:
-            await ctx.send("Option de notification invalide. Veuillez choisir 'level_up' ou 'daily_reward'.")
+            await ctx.send(f"Préférences de notification pour les récompenses quotidiennes mises à jour : {'activé' if value else 'désactivé'}")
 
     @commands.hybrid_command(name="profile", description="Affiche le profil complet de l'utilisateur")
+    @commands.guild_only()
     async def profile(self, ctx: commands.Context, member: discord.Member = None):
         member = member or ctx.author
+        guild_id = str(ctx.guild.id)
         user_id = str(member.id)
-        user = await self.get_user(user_id)
+        user = await self.get_user(guild_id, user_id)
 
         if user is None:
             await ctx.send("Cet utilisateur n'a pas encore de données de niveau.")
             return
 
-        level = user["level"]
-        xp = user["xp"]
-        next_level_xp = self.calculate_xp(level + 1)
-        xp_needed = next_level_xp - xp
-        badges = user["badges"].split(",") if user["badges"] and isinstance(user["badges"], str) else []
-        credits = user["credits"]
-        messages_sent = user["messages_sent"]
-        reactions_given = user["reactions_given"]
-        join_date = datetime.fromisoformat(user["join_date"]) if user["join_date"] else datetime.now()
-        notify_level_up = user["notify_level_up"] if user["notify_level_up"] is not None else True
-        notify_daily_reward = user["notify_daily_reward"] if user["notify_daily_reward"] is not None else True
+        level = user.level
+        xp = user.xp
+        next_level_xp = self.xp_for(guild_id, level + 1)
+        xp_needed = max(0, next_level_xp - xp)
+        badges = user.badges
+        credits = user.credits
+        messages_sent = user.messages_sent
+        reactions_given = user.reactions_given
+        position = self.rank_index.rank(guild_id, user_id)
+        join_date = datetime.fromisoformat(user.join_date) if user.join_date else datetime.now()
+        notify_level_up = user.notify_level_up
+        notify_daily_reward = user.notify_daily_reward
 
-        progress_bar = "█" * int((xp / next_level_xp) * 10)
+        progress_bar = "█" * int(min(xp / next_level_xp, 1) * 10) if next_level_xp else ""
 
         embed = discord.Embed(
             title=f"Profil de {member.display_name}",
@@ -274,6 +1145,8 @@ class Level(commands.Cog):
         embed.add_field(name="Niveau", value=f"**{level}**", inline=True)
         embed.add_field(name="XP", value=f"**{xp}** / **{next_level_xp}**", inline=True)
         embed.add_field(name="XP restant", value=f"**{xp_needed}**", inline=True)
+        if position:
+            embed.add_field(name="Classement", value=f"**#{position[0]}** sur {position[1]}", inline=True)
         embed.add_field(name="Progression", value=f"[{progress_bar}]", inline=False)
         embed.add_field(name="Badges", value=", ".join(badges) or "Aucun badge", inline=False)
         embed.add_field(name="Crédits", value=f"**{credits}**", inline=False)
@@ -290,34 +1163,13 @@ class Level(commands.Cog):
         button = discord.ui.Button(label="Réclamer Récompense", style=discord.ButtonStyle.primary)
 
         async def button_callback(interaction):
-            user_refreshed = await self.get_user(user_id)
-            last_claimed_daily = user_refreshed["last_claimed_daily"] if user_refreshed["last_claimed_daily"] else None
-            if last_claimed_daily:
-                last_claimed_time = datetime.fromisoformat(last_claimed_daily)
-                if datetime.now() < last_claimed_time + timedelta(hours=24):
-                    await interaction.response.send_message("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
-                    return
+            claimed = await self.claim_daily(guild_id, user_id)
+            if not claimed:
+                await interaction.response.send_message("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
+                return
 
-            daily_reward = 100
-            new_xp = user_refreshed["xp"] + daily_reward
-            new_level = self.calculate_level(new_xp)
-            new_credits = user_refreshed["credits"] + 50
-            await self.insert_or_update_user(
-                user_id,
-                new_xp,
-                new_level,
-                datetime.now().isoformat(),  # Mise à jour de last_claimed_daily
-                user_refreshed["last_claimed"],
-                user_refreshed["badges"],
-                new_credits,
-                user_refreshed["messages_sent"],
-                user_refreshed["reactions_given"],
-                user_refreshed["join_date"],
-                user_refreshed["notify_level_up"],
-                user_refreshed["notify_daily_reward"]
-            )
             await interaction.response.send_message(
-                f"Vous avez réclamé votre récompense quotidienne de **{daily_reward}** XP et **50** crédits !",
+                f"Vous avez réclamé votre récompense quotidienne de **{DAILY_REWARD_XP}** XP et **{DAILY_REWARD_CREDITS}** crédits !",
                 ephemeral=True
             )
 
@@ -327,25 +1179,28 @@ class Level(commands.Cog):
         await ctx.send(embed=embed, view=view)
 
     @commands.hybrid_command(name="rank", description="Affiche le rang de l'utilisateur")
+    @commands.guild_only()
     async def rank(self, ctx: commands.Context, member: discord.Member = None):
         member = member or ctx.author
+        guild_id = str(ctx.guild.id)
         user_id = str(member.id)
-        user = await self.get_user(user_id)
+        user = await self.get_user(guild_id, user_id)
 
         if user is None:
             await ctx.send("Cet utilisateur n'a pas encore de données de niveau.")
             return
 
-        level = user["level"]
-        xp = user["xp"]
-        next_level_xp = self.calculate_xp(level + 1)
-        xp_needed = next_level_xp - xp
-        badges = user["badges"].split(",") if user["badges"] and isinstance(user["badges"], str) else []
-        credits = user["credits"]
-        messages_sent = user["messages_sent"]
-        reactions_given = user["reactions_given"]
+        level = user.level
+        xp = user.xp
+        next_level_xp = self.xp_for(guild_id, level + 1)
+        xp_needed = max(0, next_level_xp - xp)
+        badges = user.badges
+        credits = user.credits
+        messages_sent = user.messages_sent
+        reactions_given = user.reactions_given
+        position = self.rank_index.rank(guild_id, user_id)
 
-        progress_bar = "█" * int((xp / next_level_xp) * 10)
+        progress_bar = "█" * int(min(xp / next_level_xp, 1) * 10) if next_level_xp else ""
 
         embed = discord.Embed(
             title=f"Rang de {member.display_name}",
@@ -354,6 +1209,8 @@ class Level(commands.Cog):
         embed.add_field(name="Niveau", value=f"**{level}**", inline=True)
         embed.add_field(name="XP", value=f"**{xp}** / **{next_level_xp}**", inline=True)
         embed.add_field(name="XP restant", value=f"**{xp_needed}**", inline=True)
+        if position:
+            embed.add_field(name="Classement", value=f"**#{position[0]}** sur {position[1]}", inline=True)
         embed.add_field(name="Progression", value=f"[{progress_bar}]", inline=False)
         embed.add_field(name="Badges", value=", ".join(badges) or "Aucun badge", inline=False)
         embed.add_field(name="Crédits", value=f"**{credits}**", inline=False)
@@ -365,34 +1222,13 @@ class Level(commands.Cog):
         button = discord.ui.Button(label="Réclamer Récompense", style=discord.ButtonStyle.primary)
 
         async def button_callback(interaction):
-            user_refreshed = await self.get_user(user_id)
-            last_claimed_daily = user_refreshed["last_claimed_daily"] if user_refreshed["last_claimed_daily"] else None
-            if last_claimed_daily:
-                last_claimed_time = datetime.fromisoformat(last_claimed_daily)
-                if datetime.now() < last_claimed_time + timedelta(hours=24):
-                    await interaction.response.send_message("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
-                    return
+            claimed = await self.claim_daily(guild_id, user_id)
+            if not claimed:
+                await interaction.response.send_message("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
+                return
 
-            daily_reward = 100
-            new_xp = user_refreshed["xp"] + daily_reward
-            new_level = self.calculate_level(new_xp)
-            new_credits = user_refreshed["credits"] + 50
-            await self.insert_or_update_user(
-                user_id,
-                new_xp,
-                new_level,
-                datetime.now().isoformat(),
-                user_refreshed["last_claimed"],
-                user_refreshed["badges"],
-                new_credits,
-                user_refreshed["messages_sent"],
-                user_refreshed["reactions_given"],
-                user_refreshed["join_date"],
-                user_refreshed["notify_level_up"],
-                user_refreshed["notify_daily_reward"]
-            )
             await interaction.response.send_message(
-                f"Vous avez réclamé votre récompense quotidienne de **{daily_reward}** XP et **50** crédits !",
+                f"Vous avez réclamé votre récompense quotidienne de **{DAILY_REWARD_XP}** XP et **{DAILY_REWARD_CREDITS}** crédits !",
                 ephemeral=True
             )
 
@@ -402,75 +1238,110 @@ class Level(commands.Cog):
         await ctx.send(embed=embed, view=view)
 
     @commands.hybrid_command(name="leaderboard", description="Affiche le classement des utilisateurs")
+    @commands.guild_only()
     async def leaderboard(self, ctx: commands.Context):
-        async with aiosqlite.connect(self.db_path) as conn:
-            conn.row_factory = aiosqlite.Row
-            cursor = await conn.execute("SELECT * FROM users ORDER BY xp DESC LIMIT 10")
-            sorted_users = await cursor.fetchall()
+        guild_id = str(ctx.guild.id)
+        count = await self.leaderboard_count(guild_id)
+        if not count:
+            # Serveur encore jamais photographié (nouveau serveur, premier démarrage)
+            await self.build_leaderboard(ctx.guild)
+            count = await self.leaderboard_count(guild_id)
+
+        pages = max(1, -(-count // LEADERBOARD_PAGE_SIZE))
+        embed = await self.leaderboard_embed(guild_id, 0, pages)
+        view = LeaderboardView(self, guild_id, pages) if pages > 1 else None
+        await ctx.send(embed=embed, view=view)
+
+    async def leaderboard_count(self, guild_id):
+        # Sous db_lock : jamais entre le DELETE et l'INSERT d'une reconstruction
+        async with self.db_lock:
+            async with self.conn.execute(
+                "SELECT MAX(position) FROM leaderboard_snapshots WHERE guild_id = ?", (guild_id,)
+            ) as cursor:
+                return (await cursor.fetchone())[0] or 0
+
+    async def leaderboard_embed(self, guild_id, page, pages):
+        first = page * LEADERBOARD_PAGE_SIZE + 1
+        async with self.db_lock:
+            async with self.conn.execute('''
+                SELECT position, display_name, level, xp, built_at FROM leaderboard_snapshots
+                WHERE guild_id = ? AND position BETWEEN ? AND ?
+                ORDER BY position
+            ''', (guild_id, first, first + LEADERBOARD_PAGE_SIZE - 1)) as cursor:
+                entries = await cursor.fetchall()
 
         embed = discord.Embed(
             title="Classement",
-            description="Top 10 des utilisateurs par XP",
+            description=f"Top des utilisateurs par XP (page {page + 1}/{pages})",
             color=discord.Color.gold()
         )
 
-        for index, user in enumerate(sorted_users, start=1):
-            member = ctx.guild.get_member(int(user["user_id"]))
-            if member:
-                embed.add_field(
-                    name=f"{index}. {member.display_name}",
-                    value=f"Niveau **{user['level']}** - XP **{user['xp']}**",
-                    inline=False
-                )
+        for entry in entries:
+            embed.add_field(
+                name=f"{entry['position']}. {entry['display_name']}",
+                value=f"Niveau **{entry['level']}** - XP **{entry['xp']}**",
+                inline=False
+            )
 
+        if entries:
+            built_at = datetime.fromisoformat(entries[0]["built_at"])
+            embed.add_field(name="Mis à jour", value=discord.utils.format_dt(built_at, "R"), inline=False)
         embed.set_footer(text="Soyez actif pour monter dans le classement et gagner des badges !")
-        await ctx.send(embed=embed)
+        return embed
+
+    async def build_leaderboard(self, guild: discord.Guild):
+        """Photographie le classement du serveur dans leaderboard_snapshots"""
+        guild_id = str(guild.id)
+        await self.flush_xp()
+        # Résolution des membres en une passe, ici plutôt qu'à chaque affichage ;
+        # les anciens membres sont sautés sans raccourcir le classement, et la lecture
+        # (par idx_users_guild_xp) s'arrête dès que le classement est complet
+        built_at = discord.utils.utcnow().isoformat()
+        rows = []
+        async with self.db_lock:
+            async with self.conn.execute(
+                "SELECT user_id, level, xp FROM users WHERE guild_id = ? ORDER BY xp DESC", (guild_id,)
+            ) as cursor:
+                async for user in cursor:
+                    member = guild.get_member(int(user["user_id"]))
+                    if member:
+                        rows.append((guild_id, len(rows) + 1, user["user_id"], member.display_name,
+                                     user["level"], user["xp"], built_at))
+                        if len(rows) == self.leaderboard_size:
+                            break
+
+        async with self.db_lock:
+            try:
+                await self.conn.execute("DELETE FROM leaderboard_snapshots WHERE guild_id = ?", (guild_id,))
+                await self.conn.executemany(
+                    "INSERT INTO leaderboard_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+                )
+                await self.conn.commit()
+            except aiosqlite.Error as e:
+                logging.error(f"Erreur lors de la mise à jour du classement de {guild.name} : {e}")
+                await self.conn.rollback()
 
     @commands.hybrid_command(name="daily", description="Réclamez votre récompense quotidienne")
+    @commands.guild_only()
     async def daily(self, ctx: commands.Context):
+        guild_id = str(ctx.guild.id)
         user_id = str(ctx.author.id)
-        daily_reward = 100
 
-        user = await self.get_user(user_id)
-        if user is None:
+        claimed = await self.claim_daily(guild_id, user_id)
+        if claimed is None:
             await ctx.send("Aucune donnée utilisateur trouvée.")
             return
+        if not claimed:
+            await ctx.send("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
+            return
 
-        last_claimed_daily = user["last_claimed_daily"] if user["last_claimed_daily"] else None
-        if last_claimed_daily:
-            last_claimed_time = datetime.fromisoformat(last_claimed_daily)
-            if datetime.now() < last_claimed_time + timedelta(hours=24):
-                await ctx.send("Vous devez attendre avant de pouvoir réclamer à nouveau.", ephemeral=True)
-                return
-
-        new_xp = user["xp"] + daily_reward
-        new_level = self.calculate_level(new_xp)
-        new_credits = user["credits"] + 50
-        await self.insert_or_update_user(
-            user_id,
-            new_xp,
-            new_level,
-            datetime.now().isoformat(),
-            user["last_claimed"],
-            user["badges"],
-            new_credits,
-            user["messages_sent"],
-            user["reactions_given"],
-            user["join_date"],
-            user["notify_level_up"],
-            user["notify_daily_reward"]
-        )
-
-        await ctx.send(f"Vous avez réclamé votre récompense quotidienne de **{daily_reward}** XP et **50** crédits !")
+        await ctx.send(f"Vous avez réclamé votre récompense quotidienne de **{DAILY_REWARD_XP}** XP et **{DAILY_REWARD_CREDITS}** crédits !")
 
     @commands.hybrid_command(name="redeem", description="Échangez vos crédits contre des récompenses")
+    @commands.guild_only()
     async def redeem(self, ctx: commands.Context, reward: str):
+        guild_id = str(ctx.guild.id)
         user_id = str(ctx.author.id)
-        user = await self.get_user(user_id)
-
-        if user is None:
-            await ctx.send("Vous n'avez pas encore de crédits.")
-            return
 
         # Exemple de récompenses
         rewards = {
@@ -482,37 +1353,365 @@ class Level(commands.Cog):
             await ctx.send("Récompense invalide. Veuillez choisir une récompense valide.")
             return
 
-        if user["credits"] < rewards[reward]:
-            await ctx.send("Vous n'avez pas assez de crédits pour cette récompense.")
+        badge = "Badge Exclusif" if reward == "badge_exclusif" else None
+        if await self.spend_credits(guild_id, user_id, rewards[reward], badge) is None:
+            if await self.get_user(guild_id, user_id) is None:
+                await ctx.send("Vous n'avez pas encore de crédits.")
+            else:
+                await ctx.send("Vous n'avez pas assez de crédits pour cette récompense.")
             return
 
-        new_credits = user["credits"] - rewards[reward]
-        new_badges = user["badges"].split(",") if user["badges"] and isinstance(user["badges"], str) else []
-
-        if reward == "badge_exclusif":
-            new_badges.append("Badge Exclusif")
-
-        await self.insert_or_update_user(
-            user_id,
-            user["xp"],
-            user["level"],
-            user["last_claimed_daily"],
-            user["last_claimed"],
-            ",".join(new_badges),
-            new_credits,
-            user["messages_sent"],
-            user["reactions_given"],
-            user["join_date"],
-            user["notify_level_up"],
-            user["notify_daily_reward"]
+        await ctx.send(f"Vous avez échangé vos crédits contre **{reward}** !")
+
+    @commands.hybrid_command(name="badge_holders", description="Liste les membres possédant un badge")
+    @commands.guild_only()
+    async def badge_holders_command(self, ctx: commands.Context, badge: str):
+        user_ids = await self.badge_holders(str(ctx.guild.id), badge)
+        holders = [member for member in (ctx.guild.get_member(int(user_id)) for user_id in user_ids) if member]
+        if not holders:
+            await ctx.send(f"Aucun membre ne possède le badge **{badge}**.")
+            return
+
+        embed = discord.Embed(
+            title=f"Badge {badge}",
+            description=", ".join(member.mention for member in holders[:50]),
+            color=discord.Color.blue()
         )
+        if len(holders) > 50:
+            embed.set_footer(text=f"... et {len(holders) - 50} autres")
+        await ctx.send(embed=embed)
 
-        await ctx.send(f"Vous avez échangé vos crédits contre **{reward}** !")
+    @commands.hybrid_command(name="set_level_curve", description="Configure la courbe d'XP du serveur")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def set_level_curve(self, ctx: commands.Context, curve_base: int = 100,
+                              curve_exponent: float = 0.55, max_level: int = 1000):
+        """Change la courbe d'XP puis recalcule le niveau de tous les membres"""
+        if curve_base <= 0 or curve_exponent <= 0 or max_level <= 0:
+            await ctx.send("❌ Les paramètres de la courbe doivent être positifs.")
+            return
+        if curve_exponent < CURVE_MIN_EXPONENT or max_level > CURVE_MAX_LEVEL:
+            await ctx.send(f"❌ L'exposant doit valoir au moins {CURVE_MIN_EXPONENT} "
+                           f"et le niveau maximal au plus {CURVE_MAX_LEVEL}.")
+            return
+        if curve_base * math.ceil(max_level ** (1 / curve_exponent)) > CURVE_MAX_XP:
+            await ctx.send("❌ Cette courbe dépasse l'XP maximale représentable : réduisez la base ou le niveau maximal.")
+            return
+
+        await ctx.defer()
+        ConfigManager.update_guild(ctx.guild.id, "leveling", {
+            "curve_base": curve_base,
+            "curve_exponent": curve_exponent,
+            "max_level": max_level,
+            "thresholds": None
+        })
+        changed = await self.recompute_levels(str(ctx.guild.id))
+        await self.build_leaderboard(ctx.guild)
+        await ctx.send(f"✅ Courbe d'XP mise à jour, {changed} niveaux recalculés")
+
+    @commands.hybrid_command(name="set_xp_cooldown", description="Délai minimal entre deux gains d'XP")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def set_xp_cooldown(self, ctx: commands.Context, seconds: int):
+        if seconds < 0:
+            await ctx.send("❌ Le délai doit être positif.")
+            return
+        ConfigManager.update_guild(ctx.guild.id, "leveling", {"xp_cooldown": seconds})
+        await ctx.send(f"✅ Un gain d'XP au plus toutes les {seconds} secondes")
+
+    @commands.hybrid_command(name="recompute_levels",description="Recalcule les niveaux selon la courbe d'XP")
+    @commands.has_permissions(administrator=True)
+    @commands.guild_only()
+    async def recompute_levels_command(self, ctx: commands.Context):
+        await ctx.defer()
+        changed = await self.recompute_levels(str(ctx.guild.id))
+        await self.build_leaderboard(ctx.guild)
+        await ctx.send(f"✅ {changed} niveaux recalculés")
+
+    @commands.command(name="level_export")
+    @commands.is_owner()
+    async def level_export(self, ctx: commands.Context, scope: str = "guild", fmt: str = "jsonl"):
+        """Exporte les profils (scope : guild ou all ; fmt : jsonl ou csv), compressés en gzip"""
+        if scope not in ("guild", "all") or fmt not in ("jsonl", "csv"):
+            return await ctx.send("❌ Usage : `level_export [guild|all] [jsonl|csv]`")
+        guild_id = str(ctx.guild.id) if scope == "guild" and ctx.guild else None
+
+        await self.flush_xp()
+        filename = f"leveling-{guild_id or 'all'}-{datetime.now():%Y%m%d-%H%M%S}.{fmt}.gz"
+        with tempfile.TemporaryDirectory(prefix="leveling-export-") as directory:
+            path = os.path.join(directory, filename)
+            # Connexion de lecture séparée : le WAL fournit un instantané cohérent sans bloquer le cog
+            count = await asyncio.to_thread(export_users_file, self.db_path, path, guild_id)
+
+            if os.path.getsize(path) <= (ctx.guild.filesize_limit if ctx.guild else 8 * 1024 * 1024):
+                # Fichier temporaire supprimé une fois envoyé
+                return await ctx.send(f"✅ {count} profils exportés", file=discord.File(path))
+
+            # Trop gros pour Discord : seul cas où l'export reste sur le disque
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            kept = shutil.move(path, os.path.join(EXPORT_DIR, filename))
+        await ctx.send(f"⚠ {count} profils exportés, fichier trop volumineux pour être envoyé : "
+                       f"conservé sur le serveur dans `{kept}` (à supprimer après récupération)")
 
-    @tasks.loop(hours=24)
+    @commands.command(name="level_import")
+    @commands.is_owner()
+    async def level_import(self, ctx: commands.Context, mode: str = "merge"):
+        """Importe le fichier joint (.jsonl/.csv, éventuellement .gz) ; mode : merge ou replace"""
+        if mode not in IMPORT_MODES or not ctx.message.attachments:
+            return await ctx.send("❌ Usage : `level_import [merge|replace]` avec le fichier en pièce jointe")
+        attachment = ctx.message.attachments[0]
+
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, f"import-{attachment.id}-{attachment.filename}")
+        await attachment.save(path)
+        try:
+            await self.flush_xp()
+            # Le cog n'écrit pas pendant l'import ; les gains continuent de s'accumuler en mémoire
+            async with self.db_lock:
+                count = await asyncio.to_thread(import_users_file, self.db_path, path, mode)
+                async with self.conn.execute("SELECT guild_id, user_id, xp FROM users") as cursor:
+                    self.rank_index.load(await cursor.fetchall())
+                async with self.conn.execute(
+                    "SELECT user_id FROM users WHERE guild_id = ?", (LEGACY_GUILD_ID,)
+                ) as cursor:
+                    self.legacy_users = {row["user_id"] for row in await cursor.fetchall()}
+            self.user_cache.invalidate()
+        except (ValueError, KeyError, csv.Error) as e:
+            return await ctx.send(f"❌ Fichier invalide : {str(e)[:100]}")
+        finally:
+            os.remove(path)
+        await ctx.send(f"✅ {count} profils importés ({mode})")
+
+    @commands.command(name="level_cache")
+    @commands.is_owner()
+    async def level_cache(self, ctx: commands.Context):
+        """Statistiques du cache des profils, pour en ajuster la taille"""
+        stats = self.user_cache.stats()
+        await ctx.send(
+            f"📊 Cache des profils : {stats['size']}/{stats['maxsize']} entrées, "
+            f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%})"
+        )
+
+    @tasks.loop(hours=24)  # intervalle remplacé dans cog_load
     async def update_leaderboard(self):
-        # Logique pour mettre à jour le classement quotidiennement, si nécessaire
-        pass
+        for guild in self.bot.guilds:
+            await self.build_leaderboard(guild)
+
+    @update_leaderboard.before_loop
+    async def before_update_leaderboard(self):
+        await self.bot.wait_until_ready()
 
 async def setup(bot):
     await bot.add_cog(Level(bot))
+
+def recompute_all_levels(db_path, guild_id=None):
+    """Recalcul hors ligne (bot arrêté) des niveaux de tous les serveurs, en une transaction"""
+    conn = sqlite3.connect(db_path)
+    try:
+        query = "SELECT guild_id, user_id, xp, level FROM users"
+        params = ()
+        if guild_id is not None:
+            query += " WHERE guild_id = ?"
+            params = (guild_id,)
+        rows_by_guild = {}
+        for row in conn.execute(query, params):
+            rows_by_guild.setdefault(row[0], []).append(row)
+
+        updates = []
+        for gid, rows in rows_by_guild.items():
+            updates.extend(level_updates(guild_curve(gid), rows))
+        with conn:
+            conn.executemany("UPDATE users SET level = ? WHERE guild_id = ? AND user_id = ?", updates)
+        return len(updates)
+    finally:
+        conn.close()
+
+# ---- Export / import en flux : mémoire constante quelle que soit la taille de la table ----
+
+EXPORT_COLUMNS = (
+    "guild_id", "user_id", "xp", "level", "last_claimed_daily", "last_claimed", "credits",
+    "messages_sent", "reactions_given", "join_date", "notify_level_up", "notify_daily_reward", "badges"
+)
+
+# Fusion de deux bases : XP, niveau et compteurs au maximum, crédits additionnés,
+# première arrivée et derniers gains conservés, préférences existantes gardées
+IMPORT_MODES = {
+    "merge": '''
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET
+            xp = MAX(COALESCE(xp, 0), excluded.xp),
+            level = MAX(COALESCE(level, 0), excluded.level),
+            last_claimed_daily = MAX(COALESCE(last_claimed_daily, ''), COALESCE(excluded.last_claimed_daily, '')),
+            last_claimed = MAX(COALESCE(last_claimed, ''), COALESCE(excluded.last_claimed, '')),
+            credits = COALESCE(credits, 0) + excluded.credits,
+            messages_sent = MAX(COALESCE(messages_sent, 0), excluded.messages_sent),
+            reactions_given = MAX(COALESCE(reactions_given, 0), excluded.reactions_given),
+            join_date = MIN(COALESCE(join_date, excluded.join_date), COALESCE(excluded.join_date, join_date))
+    ''',
+    "replace": '''
+        ON CONFLICT(guild_id, user_id) DO UPDATE SET
+            xp = excluded.xp, level = excluded.level,
+            last_claimed_daily = excluded.last_claimed_daily, last_claimed = excluded.last_claimed,
+            credits = excluded.credits, messages_sent = excluded.messages_sent,
+            reactions_given = excluded.reactions_given, join_date = excluded.join_date,
+            notify_level_up = excluded.notify_level_up, notify_daily_reward = excluded.notify_daily_reward
+    '''
+}
+
+def _file_format(path):
+    """Format (jsonl ou csv) d'après l'extension, « .gz » pour la compression"""
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".jsonl"):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    raise ValueError(f"Extension inconnue (attendu .jsonl ou .csv, éventuellement .gz) : {path}")
+
+def _open_text(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8", newline="")
+    return open(path, mode, encoding="utf-8", newline="")
+
+def export_users(conn: sqlite3.Connection, out, fmt, guild_id=None):
+    """Écrit la table users (avec les badges) dans `out`, ligne par ligne ; renvoie le nombre de profils"""
+    query = f'''
+        SELECT {", ".join("u." + column for column in EXPORT_COLUMNS[:-1])},
+               (SELECT json_group_array(b.badge) FROM user_badges b
+                WHERE b.guild_id = u.guild_id AND b.user_id = u.user_id) AS badges
+        FROM users u
+    '''
+    params = ()
+    if guild_id is not None:
+        query += " WHERE u.guild_id = ?"
+        params = (guild_id,)
+
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer:
+        writer.writerow(EXPORT_COLUMNS)
+    count = 0
+    for row in conn.execute(query, params):
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record["badges"] = json.loads(record["badges"])
+        if writer:
+            record["badges"] = ",".join(record["badges"])
+            writer.writerow(record.values())
+        else:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+def _read_records(source, fmt):
+    if fmt == "csv":
+        for record in csv.DictReader(source):
+            record["badges"] = [badge for badge in (record.get("badges") or "").split(",") if badge]
+            yield record
+    else:
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "")
+    return True if value is None else bool(value)
+
+def _user_row(record):
+    def integer(column):
+        return int(record.get(column) or 0)
+
+    def text(column):
+        return record.get(column) or None
+
+    return (
+        str(record["guild_id"] or LEGACY_GUILD_ID), str(record["user_id"]),
+        integer("xp"), integer("level"), text("last_claimed_daily"), text("last_claimed"),
+        integer("credits"), integer("messages_sent"), integer("reactions_given"), text("join_date"),
+        _flag(record.get("notify_level_up")), _flag(record.get("notify_daily_reward"))
+    )
+
+def import_users(conn: sqlite3.Connection, source, fmt, mode="merge", chunk_size=IMPORT_CHUNK_SIZE):
+    """Importe les profils de `source` par lots de `chunk_size` (un INSERT groupé par lot) ;
+    renvoie le nombre de profils lus.
+
+    Tout le fichier est importé dans une seule transaction : une ligne invalide annule
+    l'import entier (sinon un nouvel essai en fusion additionnerait deux fois les crédits).
+    """
+    upsert = f'''
+        INSERT INTO users (
+            guild_id, user_id, xp, level, last_claimed_daily, last_claimed, credits,
+            messages_sent, reactions_given, join_date, notify_level_up, notify_daily_reward
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        {IMPORT_MODES[mode]}
+    '''
+    records = _read_records(source, fmt)
+    count = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        while chunk := list(itertools.islice(records, chunk_size)):
+            rows = [_user_row(record) for record in chunk]
+            badges = [
+                (row[0], row[1], badge)
+                for row, record in zip(rows, chunk) for badge in record.get("badges") or ()
+            ]
+            conn.executemany(upsert, rows)
+            if mode == "replace":
+                conn.executemany("DELETE FROM user_badges WHERE guild_id = ? AND user_id = ?",
+                                 [row[:2] for row in rows])
+            conn.executemany("INSERT OR IGNORE INTO user_badges (guild_id, user_id, badge) VALUES (?, ?, ?)", badges)
+            count += len(rows)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return count
+
+def export_users_file(db_path, path, guild_id=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        with _open_text(path, "w") as out:
+            return export_users(conn, out, _file_format(path), guild_id)
+    finally:
+        conn.close()
+
+def import_users_file(db_path, path, mode="merge", chunk_size=IMPORT_CHUNK_SIZE):
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        with _open_text(path, "r") as source:
+            return import_users(conn, source, _file_format(path), mode, chunk_size)
+    finally:
+        conn.close()
+
+async def _migrate_file(db_path):
+    async with aiosqlite.connect(db_path) as conn:
+        await apply_migrations(conn, LEVELING_MIGRATIONS, "Level")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cogs.advancedleveling",
+                                     description="Outils hors ligne du système de niveaux")
+    parser.add_argument("--db", default="leveling_data.db", help="base SQLite du cog (défaut : leveling_data.db)")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    recompute = subcommands.add_parser("recompute", help="recalcule les niveaux selon la courbe configurée")
+    recompute.add_argument("--guild", help="limiter le recalcul à un serveur")
+    export = subcommands.add_parser("export", help="exporte les profils en JSONL ou CSV (.gz pour compresser)")
+    export.add_argument("path", help="fichier de sortie : .jsonl, .csv, .jsonl.gz ou .csv.gz")
+    export.add_argument("--guild", help="limiter l'export à un serveur")
+    import_ = subcommands.add_parser("import", help="importe des profils exportés")
+    import_.add_argument("path", help="fichier d'entrée : .jsonl, .csv, .jsonl.gz ou .csv.gz")
+    import_.add_argument("--mode", choices=IMPORT_MODES, default="merge",
+                         help="merge : XP max et crédits additionnés (défaut) ; replace : écrase les profils")
+    import_.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.command == "recompute":
+        changed = recompute_all_levels(args.db, args.guild)
+        print(f"✅ {changed} niveaux recalculés")
+    elif args.command == "export":
+        count = export_users_file(args.db, args.path, args.guild)
+        print(f"✅ {count} profils exportés dans {args.path}")
+    elif args.command == "import":
+        asyncio.run(_migrate_file(args.db))
+        count = import_users_file(args.db, args.path, args.mode, args.chunk_size)
+        print(f"✅ {count} profils importés ({args.mode})")
+
+if __name__ == "__main__":
+    main()
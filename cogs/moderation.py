@@ -3,7 +3,7 @@ from discord.ext import commands, tasks
 import re
 from datetime import datetime, timezone, timedelta
 import asyncio
-from main import ConfigManager
+from main import ConfigManager, ConfiguredChannels
 import logging
 
 # Configuration du logging
@@ -15,9 +15,23 @@ class Moderation(commands.Cog):
         self.warnings = {}
         self.temp_roles = {}
         self.pending_actions = {}
+        self.log_channels = ConfiguredChannels(bot, "moderation")
         self.check_temp_roles.start()
         self.check_pending_actions.start()
 
+    def cog_unload(self):
+        self.log_channels.close()
+        self.check_temp_roles.cancel()
+        self.check_pending_actions.cancel()
+
+    def _get_log_channel(self, guild: discord.Guild):
+        """Salon des logs du serveur (mis en cache une fois trouvé)."""
+        return self.log_channels.get(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.log_channels.discard(channel)
+
     @commands.hybrid_command(name="setup_annonces")
     @commands.has_permissions(administrator=True)
     async def setup_annonces(self, ctx: commands.Context,
@@ -49,16 +63,16 @@ class Moderation(commands.Cog):
                       couleur: str = "vert",
                       image: str = None):
         """Crée une annonce stylisée."""
-        config = ConfigManager.get_guild(ctx.guild.id, "moderation")
+        settings = ConfigManager.settings(ctx.guild.id).moderation
 
-        if not config.get("announce_channel"):
+        if not settings.announce_channel:
             return await ctx.send(
                 "❌ Salon d'annonces non configuré ! Utilisez `/setup_annonces`",
                 ephemeral=True,
                 delete_after=10
             )
 
-        channel = self.bot.get_channel(config["announce_channel"])
+        channel = self.bot.get_channel(settings.announce_channel)
 
         if not channel:
             return await ctx.send(
@@ -119,7 +133,7 @@ class Moderation(commands.Cog):
             if not ctx.interaction:
                 await ctx.message.delete()
 
-            if log_channel := self.bot.get_channel(ConfigManager.get_guild(ctx.guild.id, "moderation").get("log_channel")):
+            if log_channel := self._get_log_channel(ctx.guild):
                 await log_channel.send(
                     f"📢 Nouvelle annonce par {ctx.author.mention}",
                     embed=embed
@@ -197,8 +211,7 @@ class Moderation(commands.Cog):
         """Mute un membre (ex: 1h, 30m)."""
         await ctx.defer(ephemeral=True)
 
-        config = ConfigManager.get_guild(ctx.guild.id, "moderation")
-        mute_role = ctx.guild.get_role(config.get("mute_role"))
+        mute_role = ctx.guild.get_role(ConfigManager.settings(ctx.guild.id).moderation.mute_role)
 
         if not mute_role:
             return await ctx.send("❌ Configuration manquante ! Utilisez `/setup_moderation`", ephemeral=True)
@@ -291,8 +304,7 @@ class Moderation(commands.Cog):
     @commands.has_permissions(administrator=True)
     async def stats(self, ctx: commands.Context):
         """Affiche les statistiques de modération."""
-        config = ConfigManager.get_guild(ctx.guild.id, "moderation")
-        log_channel = self.bot.get_channel(config.get("log_channel"))
+        log_channel = self._get_log_channel(ctx.guild)
 
         if not log_channel:
             return await ctx.send("❌ Salon des logs non configuré !", ephemeral=True)
@@ -311,8 +323,7 @@ class Moderation(commands.Cog):
     @commands.hybrid_command(name="feedback")
     async def feedback(self, ctx: commands.Context, *, message: str):
         """Permet aux utilisateurs de donner du feedback sur les actions de modération."""
-        config = ConfigManager.get_guild(ctx.guild.id, "moderation")
-        log_channel = self.bot.get_channel(config.get("log_channel"))
+        log_channel = self._get_log_channel(ctx.guild)
 
         if not log_channel:
             return await ctx.send("❌ Salon des logs non configuré !", ephemeral=True)
@@ -387,8 +398,7 @@ class Moderation(commands.Cog):
 
     async def _get_or_create_mute_role(self, guild: discord.Guild) -> discord.Role:
         """Crée le rôle mute si inexistant."""
-        config = ConfigManager.get_guild(guild.id, "moderation")
-        if role_id := config.get("mute_role"):
+        if role_id := ConfigManager.settings(guild.id).moderation.mute_role:
             return guild.get_role(role_id)
 
         role = await guild.create_role(
@@ -421,14 +431,12 @@ class Moderation(commands.Cog):
     async def _schedule_unmute(self, member: discord.Member, delta: timedelta):
         """Programme le unmute automatique."""
         await asyncio.sleep(delta.total_seconds())
-        config = ConfigManager.get_guild(member.guild.id, "moderation")
-        if mute_role := member.guild.get_role(config.get("mute_role")):
+        if mute_role := member.guild.get_role(ConfigManager.settings(member.guild.id).moderation.mute_role):
             await member.remove_roles(mute_role)
 
     async def _log_action(self, guild: discord.Guild, description: str):
         """Envoie les logs de modération."""
-        config = ConfigManager.get_guild(guild.id, "moderation")
-        if log_channel := self.bot.get_channel(config.get("log_channel")):
+        if log_channel := self._get_log_channel(guild):
             embed = self._create_embed(
                 title="Journal de Modération",
                 description=description,
@@ -1,9 +1,10 @@
 import discord
 from discord.ext import commands
-from yt_dlp import YoutubeDL
 from collections import deque
 import asyncio
 import logging
+import threading
+import time
 
 # ---- Configuration youtube-dl ----
 YTDL_OPTS = {
@@ -27,6 +28,24 @@ FFMPEG_OPTS = {
     'options': '-vn'
 }
 
+# ---- Chargement paresseux de yt_dlp ----
+# yt_dlp est l'un des imports les plus lourds du bot : il n'est chargé qu'à la
+# première extraction (dans le thread de l'extraction), une seule fois.
+_youtube_dl_class = None
+_youtube_dl_lock = threading.Lock()
+
+def youtube_dl():
+    """Renvoie une instance de YoutubeDL, en important yt_dlp au premier appel."""
+    global _youtube_dl_class
+    if _youtube_dl_class is None:
+        with _youtube_dl_lock:
+            if _youtube_dl_class is None:
+                start = time.perf_counter()
+                from yt_dlp import YoutubeDL
+                _youtube_dl_class = YoutubeDL
+                logging.info("🎵 yt_dlp chargé à la demande en %.0f ms", (time.perf_counter() - start) * 1000)
+    return _youtube_dl_class(YTDL_OPTS)
+
 class Song:
     def __init__(self, data):
         self.data = data
@@ -57,7 +76,7 @@ class MusicPlayer:
         if webpage_url:
             try:
                 fresh_info = await asyncio.to_thread(
-                    lambda: YoutubeDL(YTDL_OPTS).extract_info(webpage_url, download=False)
+                    lambda: youtube_dl().extract_info(webpage_url, download=False)
                 )
                 stream_url = fresh_info.get('url')
             except Exception as e:
@@ -153,14 +172,14 @@ class Music(commands.Cog):
         # 4) Extraire les infos YouTube (en thread pour ne pas bloquer l'event loop)
         try:
             info = await asyncio.to_thread(
-                lambda: YoutubeDL(YTDL_OPTS).extract_info(f"ytsearch:{query}", download=False)['entries'][0]
+                lambda: youtube_dl().extract_info(f"ytsearch:{query}", download=False)['entries'][0]
             )
         except Exception as e:
             logging.error("Erreur lors de l'extraction (recherche) : %s", e)
             # On retente en direct
             try:
                 info = await asyncio.to_thread(
-                    lambda: YoutubeDL(YTDL_OPTS).extract_info(query, download=False)
+                    lambda: youtube_dl().extract_info(query, download=False)
                 )
             except Exception as e2:
                 logging.error("Erreur lors de l'extraction (direct) : %s", e2)
@@ -115,25 +115,26 @@ class Polls(commands.Cog):
 
     async def restore_polls(self):
         await self.bot.wait_until_ready()
-        for poll_id, data in self.poll_data.items():
-            channel = self.bot.get_channel(data['channel_id'])
-            if not channel:
-                continue
-            try:
-                message = await channel.fetch_message(data['message_id'])
-            except discord.NotFound:
-                continue
-            view = PollView(
-                options=data['options'],
-                poll_id=poll_id,
-                question=data.get('question', ""),  # Utilisez get pour éviter les erreurs de clé
-                message_id=data['message_id']
-            )
-            view.votes = data['votes']
-            view.voters = set(data['voters'])
-            view.channel_id = data['channel_id']
-            view.guild_id = data['guild_id']
-            self.bot.add_view(view, message_id=message.id)
+        with self.bot.startup_profiler.phase("Polls.restore_polls"):
+            for poll_id, data in self.poll_data.items():
+                channel = self.bot.get_channel(data['channel_id'])
+                if not channel:
+                    continue
+                try:
+                    message = await channel.fetch_message(data['message_id'])
+                except discord.NotFound:
+                    continue
+                view = PollView(
+                    options=data['options'],
+                    poll_id=poll_id,
+                    question=data.get('question', ""),  # Utilisez get pour éviter les erreurs de clé
+                    message_id=data['message_id']
+                )
+                view.votes = data['votes']
+                view.voters = set(data['voters'])
+                view.channel_id = data['channel_id']
+                view.guild_id = data['guild_id']
+                self.bot.add_view(view, message_id=message.id)
 
     @commands.hybrid_command(name="poll", description="Crée un sondage avec des boutons")
     async def poll(self, ctx: commands.Context, question: str, option1: str, option2: str, option3: str = None,
@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import ui, ButtonStyle
-from main import ConfigManager
+from main import ConfigManager, ConfiguredChannels
 import logging
 import asyncio
 
@@ -43,9 +43,9 @@ class TicketModal(ui.Modal, title="Support"):
     catégorie = ui.TextInput(label="Catégorie (technical, billing, general)", default="general")
 
     async def on_submit(self, interaction: discord.Interaction):
-        config = ConfigManager.get_guild(interaction.guild.id, "tickets")
-        category = interaction.guild.get_channel(config.get("category"))
-        staff_role = interaction.guild.get_role(config.get("staff_role"))
+        settings = ConfigManager.settings(interaction.guild.id).tickets
+        category = interaction.guild.get_channel(settings.category)
+        staff_role = interaction.guild.get_role(settings.staff_role)
 
         # Configuration des permissions
         overwrites = {
@@ -96,14 +96,14 @@ class CloseTicketView(ui.View):
 
     @ui.button(label="Confirmer la fermeture", style=ButtonStyle.red, custom_id="confirm_close_btn")
     async def confirm_close(self, interaction: discord.Interaction, button: ui.Button):
-        config = ConfigManager.get_guild(interaction.guild.id, "tickets")
+        settings = ConfigManager.settings(interaction.guild.id).tickets
         try:
             await interaction.channel.edit(name=f"fermé-{interaction.user.name}")
         except discord.HTTPException as e:
             logging.error(f"Erreur lors de la fermeture du canal : {e}")
 
-        if config.get("log_channel"):
-            log_channel = interaction.client.get_channel(config["log_channel"])
+        if settings.log_channel:
+            log_channel = interaction.client.get_channel(settings.log_channel)
             if log_channel:
                 await log_channel.send(f"📂 Ticket fermé par {interaction.user.mention}")
 
@@ -113,9 +113,9 @@ class FeedbackModal(ui.Modal, title="Feedback"):
     feedback = ui.TextInput(label="Votre feedback", style=discord.TextStyle.long)
 
     async def on_submit(self, interaction: discord.Interaction):
-        config = ConfigManager.get_guild(interaction.guild.id, "tickets")
-        if config.get("log_channel"):
-            log_channel = interaction.client.get_channel(config["log_channel"])
+        settings = ConfigManager.settings(interaction.guild.id).tickets
+        if settings.log_channel:
+            log_channel = interaction.client.get_channel(settings.log_channel)
             if log_channel:
                 embed = discord.Embed(
                     title="Feedback reçu",
@@ -129,7 +129,21 @@ class FeedbackModal(ui.Modal, title="Feedback"):
 class Tickets(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.bot.add_view(TicketView())
+        self.log_channels = ConfiguredChannels(bot, "tickets")
+        with self.bot.startup_profiler.phase("Tickets.add_view"):
+            self.bot.add_view(TicketView())
+
+    async def cog_load(self):
+        # Démarré une seule fois, et non à chaque on_ready (reconnexions)
+        self.archive_task = asyncio.create_task(self.archive_tickets())
+
+    def cog_unload(self):
+        self.log_channels.close()
+        self.archive_task.cancel()
+
+    def _get_log_channel(self, guild: discord.Guild):
+        """Salon des logs des tickets (mis en cache une fois trouvé)"""
+        return self.log_channels.get(guild)
 
     @commands.hybrid_command(name="setup_tickets")
     @commands.has_permissions(administrator=True)
@@ -233,8 +247,7 @@ class Tickets(commands.Cog):
             return
 
         if message.channel.name.startswith("ticket-"):
-            config = ConfigManager.get_guild(message.guild.id, "tickets")
-            log_channel = self.bot.get_channel(config.get("log_channel"))
+            log_channel = self._get_log_channel(message.guild)
             if log_channel:
                 embed = discord.Embed(
                     title="Nouveau message dans le ticket",
@@ -258,8 +271,8 @@ class Tickets(commands.Cog):
                                 await channel.edit(name=f"archivé-{channel.name}")
 
     @commands.Cog.listener()
-    async def on_ready(self):
-        self.bot.loop.create_task(self.archive_tickets())
+    async def on_guild_channel_delete(self, channel):
+        self.log_channels.discard(channel)
 
 async def setup(bot):
     await bot.add_cog(Tickets(bot))
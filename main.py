@@ -1,8 +1,30 @@
+import time
+
+# Origine des mesures du profilage de démarrage (avant l'import de discord.py)
+PROCESS_START = time.perf_counter()
+
 import discord
 from discord.ext import commands
+import asyncio
+import contextlib
+import contextvars
+import copy
+import hashlib
 import json
 import os
+import sqlite3
+import sys
+import tempfile
+import threading
 import logging
+from dataclasses import dataclass
+
+IMPORTS_DONE = time.perf_counter()
+
+# Lorsque le bot est lancé via `python main.py`, les cogs font `from main import ...` :
+# on enregistre ce module sous le nom "main" pour qu'ils partagent le même cache de configuration.
+if __name__ == '__main__':
+    sys.modules.setdefault('main', sys.modules[__name__])
 
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
@@ -23,11 +45,219 @@ STATUS_TYPES = {
     "invisible": discord.Status.invisible
 }
 
+def _snowflake(value):
+    """Convertit un identifiant Discord stocké dans la configuration (None si absent ou invalide)"""
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Identifiant invalide dans la configuration : {value!r}")
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class ModerationSettings:
+    announce_channel: int | None = None
+    log_channel: int | None = None
+    mute_role: int | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            announce_channel=_snowflake(data.get("announce_channel")),
+            log_channel=_snowflake(data.get("log_channel")),
+            mute_role=_snowflake(data.get("mute_role"))
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class TicketSettings:
+    category: int | None = None
+    log_channel: int | None = None
+    staff_role: int | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            category=_snowflake(data.get("category")),
+            log_channel=_snowflake(data.get("log_channel")),
+            staff_role=_snowflake(data.get("staff_role"))
+        )
+
+
+# Bornes de la courbe d'XP : au-delà, sa construction bloquerait la boucle d'événements
+# et les seuils dépasseraient les entiers 64 bits de SQLite (et de NumPy)
+CURVE_MIN_EXPONENT = 0.3
+CURVE_MAX_LEVEL = 5000
+CURVE_MAX_XP = 2 ** 63 - 1
+
+
+@dataclass(frozen=True, slots=True)
+class LevelingSettings:
+    """Courbe d'XP : seuil du niveau N = curve_base * ceil(N ** (1 / curve_exponent)),
+    ou `thresholds` (XP minimale de chaque niveau à partir du niveau 0) si fourni.
+    `xp_cooldown` : secondes minimales entre deux gains d'XP d'un membre ;
+    `reaction_xp` : XP accordée par réaction ajoutée (0 : réactions seulement comptées) ;
+    `level_roles` : (niveau, rôle) obtenus à partir de ce niveau ;
+    `replace_level_roles` : ne garder que le rôle du niveau le plus haut atteint
+
+    Les paramètres de la courbe sont ramenés dans les bornes CURVE_* ci-dessus."""
+    curve_base: int = 100
+    curve_exponent: float = 0.55
+    max_level: int = 1000
+    thresholds: tuple[int, ...] | None = None
+    xp_cooldown: float = 60
+    reaction_xp: int = 0
+    level_roles: tuple[tuple[int, int], ...] = ()
+    replace_level_roles: bool = False
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        defaults = cls()
+        try:
+            thresholds = data.get("thresholds")
+            return cls(
+                curve_base=min(max(1, int(data.get("curve_base", defaults.curve_base))), CURVE_MAX_XP),
+                curve_exponent=max(CURVE_MIN_EXPONENT,
+                                   float(data.get("curve_exponent", defaults.curve_exponent))),
+                max_level=min(max(1, int(data.get("max_level", defaults.max_level))), CURVE_MAX_LEVEL),
+                thresholds=tuple(sorted(
+                    t for t in map(int, thresholds) if 0 < t <= CURVE_MAX_XP
+                )[:CURVE_MAX_LEVEL]) or None if thresholds else None,
+                xp_cooldown=max(0.0, float(data.get("xp_cooldown", defaults.xp_cooldown))),
+                reaction_xp=max(0, int(data.get("reaction_xp", defaults.reaction_xp))),
+                level_roles=tuple(sorted(
+                    (int(level), role_id) for level, role_id in
+                    ((level, _snowflake(role)) for level, role in (data.get("level_roles") or {}).items())
+                    if role_id is not None
+                )),
+                replace_level_roles=bool(data.get("replace_level_roles", defaults.replace_level_roles))
+            )
+        except (TypeError, ValueError):
+            logging.warning(f"Courbe d'XP invalide dans la configuration : {data!r}")
+            return defaults
+
+
+@dataclass(frozen=True, slots=True)
+class GuildSettings:
+    """Configuration validée et figée d'un serveur, reconstruite uniquement quand elle change"""
+    guild_id: int
+    moderation: ModerationSettings
+    tickets: TicketSettings
+    leveling: LevelingSettings
+
+    @classmethod
+    def from_dict(cls, guild_id: int, data: dict):
+        return cls(
+            guild_id=guild_id,
+            moderation=ModerationSettings.from_dict(data.get("moderation", {})),
+            tickets=TicketSettings.from_dict(data.get("tickets", {})),
+            leveling=LevelingSettings.from_dict(data.get("leveling", {}))
+        )
+
+
+class SqliteGuildStore:
+    """Stockage des configurations de serveur dans SQLite, une ligne par (serveur, catégorie).
+
+    Une mise à jour ne réécrit que les lignes modifiées au lieu de tout config.json.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS guild_config (
+                guild_id TEXT NOT NULL,
+                category TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (guild_id, category)
+            )
+        ''')
+        self._conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM guild_config LIMIT 1").fetchone() is None
+
+    def load(self) -> dict:
+        """Charge toutes les configurations sous la forme {guild_id: {catégorie: données}}"""
+        guilds = {}
+        with self._lock:
+            rows = self._conn.execute("SELECT guild_id, category, data FROM guild_config").fetchall()
+        for guild_id, category, data in rows:
+            guilds.setdefault(guild_id, {})[category] = json.loads(data)
+        return guilds
+
+    def write(self, upserts, deleted_guilds):
+        """Applique les suppressions puis les upserts dans une seule transaction"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM guild_config WHERE guild_id = ?",
+                [(guild_id,) for guild_id in deleted_guilds]
+            )
+            self._conn.executemany('''
+                INSERT INTO guild_config (guild_id, category, data) VALUES (?, ?, ?)
+                ON CONFLICT(guild_id, category) DO UPDATE SET data = excluded.data
+            ''', upserts)
+
+    def import_guilds(self, guilds: dict) -> int:
+        """Importe un dictionnaire `guilds` au format de config.json"""
+        rows = [
+            (str(guild_id), category, json.dumps(data))
+            for guild_id, categories in guilds.items()
+            for category, data in categories.items()
+        ]
+        self.write(rows, ())
+        return len(rows)
+
+
+# Erreurs possibles à la lecture de la configuration (fichier, JSON, structure, stockage SQLite)
+CONFIG_ERRORS = (OSError, ValueError, TypeError, AttributeError, KeyError, sqlite3.Error)
+
+
 class ConfigManager:
+    """Configuration du bot, conservée en mémoire pour tout le processus.
+
+    Le fichier n'est relu que si son mtime/inode/taille change (vérifié au plus
+    toutes les RELOAD_CHECK_INTERVAL secondes) ou après un appel à `reload()`.
+    Les dictionnaires renvoyés par `get_guild` sont ceux du cache : lecture seule.
+
+    Les écritures sont différées : toutes les modifications faites pendant
+    FLUSH_DELAY secondes sont regroupées en une seule écriture atomique
+    (fichier temporaire + fsync + rename). `flush()` force l'écriture immédiate.
+
+    Avec `"storage": {"backend": "sqlite", "path": "config.db"}` dans config.json,
+    les configurations des serveurs sont stockées dans SQLite (voir SqliteGuildStore)
+    et config.json ne garde que les paramètres globaux.
+
+    `settings(guild_id)` renvoie une GuildSettings figée, mise en cache par serveur.
+    `subscribe(category, callback)` permet aux cogs d'être prévenus des changements.
+    """
+    PATH = 'config.json'
+    RELOAD_CHECK_INTERVAL = 5.0
+    FLUSH_DELAY = 2.0
+
+    _cache = None
+    _stamp = None
+    _checked_at = 0.0
+    _store = None
+    _settings = {}
+    _subscribers = {}
+
+    _dirty_globals = False
+    _dirty_keys = set()
+    _deleted_guilds = set()
+    _flush_handle = None
+    _flush_task = None
+    _write_lock = threading.Lock()
+
     @staticmethod
-    def load():
-        """Charge ou crée la configuration avec valeurs par défaut"""
-        default_config = {
+    def _defaults():
+        return {
             "prefix": "!",
             "token": "VOTRE_TOKEN",
             "rpc": {
@@ -36,102 +266,654 @@ class ConfigManager:
                 "url": "",
                 "status": "online"
             },
+            "storage": {
+                "backend": "json",
+                "path": "config.db"
+            },
+            "auto_sync": True,
+            "profile_startup": False,
+            "leveling": {
+                "leaderboard_interval": 3600,
+                "leaderboard_size": 1000
+            },
             "guilds": {}
         }
 
+    @classmethod
+    def _file_stamp(cls):
+        """Signature du fichier utilisée pour détecter une modification externe"""
+        try:
+            st = os.stat(cls.PATH)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    @classmethod
+    def _read(cls):
+        """Lit le fichier et le fusionne avec les valeurs par défaut.
+
+        Les valeurs par défaut seules ne sont utilisées qu'au premier chargement et si le
+        fichier n'existe pas ; sinon une erreur de lecture est levée (CONFIG_ERRORS).
+        """
+        default_config = cls._defaults()
         try:
-            with open('config.json', 'r') as f:
+            with open(cls.PATH, 'r') as f:
                 config = json.load(f)
 
-                # Fusion récursive des configurations
-                def merge(d, u):
-                    for k, v in u.items():
-                        if isinstance(v, dict):
-                            d[k] = merge(d.get(k, {}), v)
-                        else:
-                            d[k] = v
-                    return d
-
-                return merge(default_config.copy(), config)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
+            # Fusion récursive des configurations
+            def merge(d, u):
+                for k, v in u.items():
+                    if isinstance(v, dict):
+                        d[k] = merge(d.get(k, {}), v)
+                    else:
+                        d[k] = v
+                return d
+
+            config = merge(default_config, config)
+        except FileNotFoundError as e:
+            if cls._cache is not None:
+                raise
             logging.error(f"Erreur lors du chargement de la configuration : {e}")
-            return default_config
+            config = default_config
 
-    @staticmethod
-    def save(data):
-        """Sauvegarde la configuration dans le fichier"""
+        if config["storage"].get("backend") == "sqlite":
+            store = cls._open_store(config["storage"].get("path", "config.db"))
+            if store.is_empty() and config["guilds"]:
+                count = store.import_guilds(config["guilds"])
+                logging.info(f"⚙ {count} configurations de serveur importées depuis {cls.PATH} vers {store.path}")
+            config["guilds"] = store.load()
+        else:
+            cls._store = None
+        return config
+
+    @classmethod
+    def _open_store(cls, path: str):
+        if cls._store is None or cls._store.path != path:
+            cls._store = SqliteGuildStore(path)
+        return cls._store
+
+    @classmethod
+    def _is_dirty(cls):
+        return cls._dirty_globals or bool(cls._dirty_keys) or bool(cls._deleted_guilds)
+
+    @classmethod
+    def _config(cls):
+        """Renvoie la configuration en cache, rechargée si le fichier a changé"""
+        now = time.monotonic()
+        if cls._cache is not None and (cls._is_dirty() or now - cls._checked_at < cls.RELOAD_CHECK_INTERVAL):
+            return cls._cache
+
+        cls._checked_at = now
+        stamp = cls._file_stamp()
+        if cls._cache is None or stamp != cls._stamp:
+            reloaded = cls._cache is not None
+            try:
+                config = cls._read()
+            except CONFIG_ERRORS as e:
+                if not reloaded:
+                    raise
+                # Fichier en cours d'écriture ou invalide : on garde la version en mémoire
+                # (et l'ancienne signature, pour réessayer à la prochaine vérification)
+                logging.error(f"Configuration illisible, version en mémoire conservée : {e}")
+                return cls._cache
+            cls._stamp = stamp
+            cls._cache = config
+            cls._settings.clear()
+            if reloaded:
+                cls._notify(None, None)
+        return cls._cache
+
+    @classmethod
+    def reload(cls):
+        """Force la relecture du fichier (les modifications en attente sont d'abord écrites).
+
+        Lève une erreur de CONFIG_ERRORS si le fichier est illisible ; la configuration
+        en mémoire est alors conservée.
+        """
+        cls.flush()
+        stamp = cls._file_stamp()
+        config = cls._read()
+        cls._stamp = stamp
+        cls._checked_at = time.monotonic()
+        cls._cache = config
+        cls._settings.clear()
+        cls._notify(None, None)
+        return config
+
+    @classmethod
+    def load(cls):
+        """Renvoie une copie modifiable de la configuration"""
+        return copy.deepcopy(cls._config())
+
+    @classmethod
+    def load_setting(cls, key: str, default=None):
+        """Lit un paramètre global sans copier toute la configuration"""
+        return cls._config().get(key, default)
+
+    @classmethod
+    def import_json_guilds(cls):
+        """Importe (en écrasant) les serveurs présents dans config.json vers le stockage SQLite"""
+        if cls._store is None:
+            raise RuntimeError("Le stockage SQLite n'est pas activé dans config.json")
+        cls.flush()
+        with open(cls.PATH, 'r') as f:
+            guilds = json.load(f).get("guilds", {})
+        count = cls._store.import_guilds(guilds)
+        cls.reload()
+        return count
+
+    @classmethod
+    def _write_atomic(cls, payload: str):
+        """Écrit le fichier via un fichier temporaire renommé (jamais de fichier tronqué)"""
+        directory = os.path.dirname(os.path.abspath(cls.PATH))
+        fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.tmp', dir=directory)
         try:
-            with open('config.json', 'w') as f:
-                json.dump(data, f, indent=4)
-        except IOError as e:
+            with os.fdopen(fd, 'w') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, cls.PATH)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        cls._stamp = cls._file_stamp()
+
+    @classmethod
+    def _snapshot(cls):
+        """Capture les modifications en attente et remet les marqueurs à zéro"""
+        config = cls._cache
+        payload = None
+        if cls._store is None:
+            payload = json.dumps(config, indent=4)
+        elif cls._dirty_globals:
+            payload = json.dumps({k: v for k, v in config.items() if k != "guilds"}, indent=4)
+
+        upserts = [
+            (guild_id, category, json.dumps(config["guilds"][guild_id][category]))
+            for guild_id, category in cls._dirty_keys
+            if category in config["guilds"].get(guild_id, {})
+        ]
+        pending = (cls._dirty_globals, set(cls._dirty_keys), set(cls._deleted_guilds))
+
+        cls._dirty_globals = False
+        cls._dirty_keys = set()
+        cls._deleted_guilds = set()
+        return payload, upserts, pending
+
+    @classmethod
+    def _write(cls, payload, upserts, deleted_guilds, store):
+        with cls._write_lock:
+            if payload is not None:
+                cls._write_atomic(payload)
+            if store is not None and (upserts or deleted_guilds):
+                store.write(upserts, deleted_guilds)
+
+    @classmethod
+    def _restore_pending(cls, pending):
+        """Remet en attente des modifications dont l'écriture a échoué"""
+        dirty_globals, keys, deleted = pending
+        cls._dirty_globals |= dirty_globals
+        cls._dirty_keys |= keys
+        cls._deleted_guilds |= deleted
+
+    @classmethod
+    def _mark_dirty(cls, keys=(), deleted=(), dirty_globals=False):
+        """Programme une écriture groupée (immédiate hors boucle asyncio)"""
+        cls._dirty_globals |= dirty_globals
+        cls._dirty_keys.update(keys)
+        cls._deleted_guilds.update(deleted)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            cls.flush()
+            return
+
+        if cls._flush_handle is None:
+            cls._flush_handle = loop.call_later(cls.FLUSH_DELAY, cls._schedule_flush)
+
+    @classmethod
+    def _schedule_flush(cls):
+        cls._flush_handle = None
+        if cls._is_dirty():
+            cls._flush_task = asyncio.ensure_future(cls._flush_async(cls._flush_task))
+
+    @classmethod
+    async def _flush_async(cls, previous):
+        # Les écritures restent ordonnées : on attend la précédente avant de capturer
+        # les modifications (une annulation pendant l'attente les laisse en attente)
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        payload, upserts, pending = cls._snapshot()
+        try:
+            await asyncio.to_thread(cls._write, payload, upserts, pending[2], cls._store)
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Erreur lors de la sauvegarde de la configuration : {e}")
+            cls._restore_pending(pending)
+            cls._mark_dirty()
+        except BaseException:
+            # Annulation (arrêt) : le dernier flush() réécrira ces modifications
+            cls._restore_pending(pending)
+            raise
+
+    @classmethod
+    def flush(cls):
+        """Écrit immédiatement les modifications en attente (à appeler à l'arrêt)"""
+        if cls._flush_handle is not None:
+            cls._flush_handle.cancel()
+            cls._flush_handle = None
+        if not cls._is_dirty():
+            return
+
+        payload, upserts, pending = cls._snapshot()
+        try:
+            cls._write(payload, upserts, pending[2], cls._store)
+        except (OSError, sqlite3.Error) as e:
+            cls._restore_pending(pending)
             logging.error(f"Erreur lors de la sauvegarde de la configuration : {e}")
 
+    @classmethod
+    def save(cls, data):
+        """Remplace toute la configuration (écriture différée)"""
+        old_guilds = cls._config()["guilds"]
+        cls._cache = data
+        cls._settings.clear()
+        cls._mark_dirty(
+            keys=((g, c) for g, categories in data["guilds"].items() for c in categories),
+            deleted=(g for g in old_guilds if g not in data["guilds"]),
+            dirty_globals=True
+        )
+        cls._notify(None, None)
+
     @classmethod
     def update_guild(cls, guild_id: int, category: str, new_data: dict):
         """Met à jour la configuration d'un serveur"""
-        config = cls.load()
+        config = cls._config()
         guild_entry = config["guilds"].setdefault(str(guild_id), {})
         guild_entry[category] = {**guild_entry.get(category, {}), **new_data}
-        cls.save(config)
+        cls._settings.pop(int(guild_id), None)
+        cls._mark_dirty(keys=[(str(guild_id), category)])
+        cls._notify(int(guild_id), category)
+
+    @classmethod
+    def remove_guild(cls, guild_id: int):
+        """Supprime la configuration d'un serveur"""
+        key = str(guild_id)
+        if cls._config()["guilds"].pop(key, None) is not None:
+            cls._settings.pop(int(guild_id), None)
+            cls._dirty_keys = {k for k in cls._dirty_keys if k[0] != key}
+            cls._mark_dirty(deleted=[key])
+            cls._notify(int(guild_id), None)
+
+    @classmethod
+    def prune_guilds(cls, guild_ids):
+        """Ne garde que la configuration des serveurs donnés"""
+        keep = {str(g) for g in guild_ids}
+        guilds = cls._config()["guilds"]
+        removed = [k for k in guilds if k not in keep]
+        for key in removed:
+            del guilds[key]
+            cls._settings.pop(int(key), None)
+        if removed:
+            cls._dirty_keys = {k for k in cls._dirty_keys if k[0] not in removed}
+            cls._mark_dirty(deleted=removed)
+            for key in removed:
+                cls._notify(int(key), None)
 
     @classmethod
     def get_guild(cls, guild_id: int, category: str = None):
         """Récupère la configuration d'un serveur"""
-        config = cls.load()
-        guild_data = config["guilds"].get(str(guild_id), {})
+        guild_data = cls._config()["guilds"].get(str(guild_id), {})
         return guild_data.get(category, {}) if category else guild_data
 
-# Initialisation du bot
-config = ConfigManager.load()
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix=config['prefix'], intents=intents)
+    @classmethod
+    def subscribe(cls, category, callback):
+        """Enregistre `callback(guild_id)` appelé quand la catégorie change.
 
-@bot.event
-async def on_ready():
-    logging.info(f'✅ Connecté en tant que {bot.user} ({bot.user.id})')
+        `category=None` écoute toutes les catégories. `guild_id` vaut None quand
+        toute la configuration a été rechargée. Les coroutines sont planifiées.
+        """
+        cls._subscribers.setdefault(category, []).append(callback)
 
-    # Chargement automatique des cogs
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py') and not filename.startswith('__'):
-            try:
-                await bot.load_extension(f'cogs.{filename[:-3]}')
-                logging.info(f'✅ Cog chargé : {filename}')
-            except Exception as e:
-                logging.error(f'❌ Erreur avec {filename}: {e}')
+    @classmethod
+    def unsubscribe(cls, category, callback):
+        callbacks = cls._subscribers.get(category, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    @classmethod
+    def _notify(cls, guild_id, category):
+        """Prévient les abonnés (category=None : toutes les catégories du serveur ont changé)"""
+        for subscribed, callbacks in cls._subscribers.items():
+            if category is not None and subscribed is not None and subscribed != category:
+                continue
+            for callback in list(callbacks):
+                try:
+                    result = callback(guild_id)
+                    if asyncio.iscoroutine(result):
+                        asyncio.ensure_future(result)
+                except Exception as e:
+                    logging.error(f"Erreur dans un abonné à la configuration ({subscribed}) : {e}")
+
+    @classmethod
+    def settings(cls, guild_id: int) -> GuildSettings:
+        """Configuration typée d'un serveur (reconstruite seulement après une modification)"""
+        config = cls._config()
+        settings = cls._settings.get(guild_id)
+        if settings is None:
+            settings = GuildSettings.from_dict(guild_id, config["guilds"].get(str(guild_id), {}))
+            cls._settings[guild_id] = settings
+        return settings
+
+
+class ConfiguredChannels:
+    """Salons configurés (`category`.`attribute`) résolus par serveur, pour un cog.
+
+    Seuls les salons trouvés sont mis en cache : un salon introuvable (serveur
+    momentanément indisponible, salon recréé plus tard) est recherché à nouveau
+    au prochain appel. Le cache est vidé quand la configuration change.
+    """
+
+    def __init__(self, bot, category: str, attribute: str = "log_channel"):
+        self.bot = bot
+        self.category = category
+        self.attribute = attribute
+        self._channels = {}
+        ConfigManager.subscribe(category, self.invalidate)
+
+    def close(self):
+        ConfigManager.unsubscribe(self.category, self.invalidate)
+
+    def invalidate(self, guild_id=None):
+        if guild_id is None:
+            self._channels.clear()
+        else:
+            self._channels.pop(guild_id, None)
+
+    def get(self, guild):
+        channel = self._channels.get(guild.id)
+        if channel is None:
+            channel_id = getattr(getattr(ConfigManager.settings(guild.id), self.category), self.attribute)
+            channel = self.bot.get_channel(channel_id) if channel_id else None
+            if channel is not None:
+                self._channels[guild.id] = channel
+        return channel
+
+    def discard(self, channel):
+        """À appeler depuis on_guild_channel_delete"""
+        if self._channels.get(channel.guild.id) == channel:
+            del self._channels[channel.guild.id]
+
+async def apply_migrations(conn, migrations, name: str):
+    """Met à jour le schéma d'une base SQLite (connexion aiosqlite) d'après PRAGMA user_version.
+
+    `migrations[i]` fait passer le schéma de la version i à i + 1 : une requête SQL,
+    une liste de requêtes, ou une coroutine `step(conn)`. Seules les étapes pas encore
+    appliquées sont exécutées, chacune dans sa propre transaction avec sa nouvelle
+    version : une étape interrompue est rejouée entièrement au démarrage suivant.
+    """
+    async with conn.execute("PRAGMA user_version") as cursor:
+        (version,) = await cursor.fetchone()
+    if version > len(migrations):
+        raise RuntimeError(f"{name} : schéma en version {version}, plus récent que le code ({len(migrations)})")
+
+    for target, step in enumerate(migrations[version:], start=version + 1):
+        logging.info(f"🔄 {name} : migration du schéma vers la version {target}")
+        await conn.commit()
+        await conn.execute("BEGIN")
+        try:
+            if callable(step):
+                await step(conn)
+            else:
+                for statement in ([step] if isinstance(step, str) else step):
+                    await conn.execute(statement)
+            await conn.execute(f"PRAGMA user_version = {target}")
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+    return len(migrations)
+
+class StartupProfiler:
+    """Mesure la durée de chaque phase du démarrage.
+
+    Activé par la variable d'environnement SYNTHIA_PROFILE_STARTUP=1 ou par
+    `"profile_startup": true` dans config.json ; sinon `phase()` ne fait rien.
+    Le rapport est écrit dans REPORT_PATH au premier READY, puis réécrit si
+    une phase se termine plus tard (ex. restauration des sondages).
+    """
+    REPORT_PATH = 'startup_profile.json'
+
+    def __init__(self, enabled: bool, origin: float):
+        self.enabled = enabled
+        self.origin = origin
+        self.phases = []
+        self.reported = False
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def record(self, name: str, start: float, end: float = None):
+        if not self.enabled:
+            return
+        end = time.perf_counter() if end is None else end
+        entry = {
+            "phase": name,
+            "start_ms": round((start - self.origin) * 1000, 2),
+            "duration_ms": round((end - start) * 1000, 2)
+        }
+        self.phases.append(entry)
+        if self.reported:
+            logging.info(f"⏱   {entry['phase']:<40} {entry['duration_ms']:>9.1f} ms (à +{entry['start_ms']:.0f} ms)")
+            self._write()
 
-    # Configuration du RPC
-    rpc_config = config.get('rpc', {})
+    def report(self):
+        """Écrit le rapport JSON et en résume les phases les plus longues dans les logs"""
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        self._write()
+
+        logging.info(f"⏱ Profil de démarrage ({self.REPORT_PATH}) :")
+        for entry in sorted(self.phases, key=lambda p: p["duration_ms"], reverse=True)[:15]:
+            logging.info(f"⏱   {entry['phase']:<40} {entry['duration_ms']:>9.1f} ms (à +{entry['start_ms']:.0f} ms)")
+
+    def _write(self):
+        report = {
+            "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "python": sys.version.split()[0],
+            "discord.py": discord.__version__,
+            "phases": self.phases
+        }
+        try:
+            with open(self.REPORT_PATH, 'w') as f:
+                json.dump(report, f, indent=4)
+        except OSError as e:
+            logging.error(f"Erreur lors de l'écriture du profil de démarrage : {e}")
+
+
+def build_activity(rpc_config: dict):
+    """Construit l'activité affichée par le bot à partir de la section rpc"""
     activity_type = RPC_TYPES.get(rpc_config.get('type', 'playing'), discord.ActivityType.playing)
 
-    # Création de l'activité
     if activity_type == discord.ActivityType.streaming:
-        activity = discord.Streaming(
+        return discord.Streaming(
             name=rpc_config.get('name', ''),
             url=rpc_config.get('url', 'https://twitch.tv'),
             platform="Twitch"
         )
-    else:
-        activity = discord.Activity(
-            name=rpc_config.get('name', 'Un jeu'),
-            type=activity_type
+    return discord.Activity(
+        name=rpc_config.get('name', 'Un jeu'),
+        type=activity_type
+    )
+
+
+# Extension en cours de chargement dans la tâche courante (les cogs sont chargés en parallèle)
+_loading_extension = contextvars.ContextVar('_loading_extension', default=None)
+
+
+class SynthiaBot(commands.Bot):
+    """Bot dont les cogs sont chargés une seule fois, avant la connexion à la gateway"""
+    COMMAND_HASHES_PATH = 'command_tree.json'
+
+    def __init__(self, *args, startup_profiler: StartupProfiler = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.extension_load_times = {}
+        self._cog_setup_times = {}
+        self.startup_profiler = startup_profiler or StartupProfiler(False, PROCESS_START)
+
+    async def login(self, token: str):
+        # La durée inclut setup_hook, appelé par discord.py à la fin de login()
+        with self.startup_profiler.phase('login'):
+            await super().login(token)
+
+    async def setup_hook(self):
+        with self.startup_profiler.phase('setup_hook'):
+            await self._setup()
+
+    async def _setup(self):
+        # Chargement automatique et concurrent des cogs
+        extensions = [
+            f'cogs.{filename[:-3]}' for filename in sorted(os.listdir('./cogs'))
+            if filename.endswith('.py') and not filename.startswith('__')
+        ]
+        start = time.perf_counter()
+        await asyncio.gather(*(self._load_extension_timed(name) for name in extensions))
+        logging.info(
+            f'✅ {len(self.extensions)}/{len(extensions)} cogs chargés en '
+            f'{(time.perf_counter() - start) * 1000:.0f} ms'
         )
 
-    # Application du statut
-    await bot.change_presence(
-        activity=activity,
-        status=STATUS_TYPES.get(rpc_config.get('status', 'online'), discord.Status.online)
-    )
+        if not ConfigManager.load_setting('auto_sync', True):
+            return
+        if len(self.extensions) < len(extensions):
+            # Synchroniser retirerait globalement les commandes slash des cogs en erreur
+            failed = sorted(set(extensions) - set(self.extensions))
+            logging.warning(
+                f'⚠ Synchronisation automatique ignorée : cogs non chargés ({", ".join(failed)})'
+            )
+            return
+        try:
+            with self.startup_profiler.phase('sync_commands'):
+                synced = await self.sync_commands()
+        except discord.HTTPException as e:
+            logging.error(f'❌ Synchronisation des commandes impossible : {e}')
+        else:
+            if synced is None:
+                logging.info('✅ Commandes slash déjà à jour, pas de synchronisation')
+            else:
+                logging.info(f'✅ {synced} commandes slash synchronisées')
 
-    # Synchronisation des configurations
-    current_guilds = {str(g.id) for g in bot.guilds}
-    config_data = ConfigManager.load()
+    async def add_cog(self, cog, /, **kwargs):
+        # Mesure add_cog (dont cog_load) pour la déduire du chargement de l'extension
+        start = time.perf_counter()
+        with self.startup_profiler.phase(f'add_cog:{cog.qualified_name}'):
+            await super().add_cog(cog, **kwargs)
+        name = _loading_extension.get()
+        if name is not None:
+            self._cog_setup_times[name] = self._cog_setup_times.get(name, 0.0) + time.perf_counter() - start
+
+    async def _load_extension_timed(self, name: str):
+        _loading_extension.set(name)
+        start = time.perf_counter()
+        try:
+            with self.startup_profiler.phase(f'load:{name}'):
+                await self.load_extension(name)
+        except Exception as e:
+            logging.error(f'❌ Erreur avec {name}: {e}')
+            return
+        end = time.perf_counter()
+        # Le module n'est exécuté qu'une fois (par load_extension) : la part « import »
+        # est le chargement moins les add_cog, mesurés à part
+        self.startup_profiler.record(f'import:{name}', start, end - self._cog_setup_times.get(name, 0.0))
+        elapsed = (end - start) * 1000
+        self.extension_load_times[name] = elapsed
+        logging.info(f'✅ Cog chargé : {name} ({elapsed:.0f} ms)')
+
+    def command_tree_fingerprint(self, guild=None) -> str:
+        """Empreinte stable des commandes slash telles qu'elles seraient envoyées à Discord"""
+        payload = sorted(
+            (command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)),
+            key=lambda c: (c.get('type', 1), c['name'])
+        )
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _load_command_hashes(self) -> dict:
+        try:
+            with open(self.COMMAND_HASHES_PATH, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_command_hashes(self, hashes: dict):
+        tmp_path = f'{self.COMMAND_HASHES_PATH}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(hashes, f, indent=4)
+            os.replace(tmp_path, self.COMMAND_HASHES_PATH)
+        except OSError as e:
+            logging.error(f"Erreur lors de la sauvegarde de l'empreinte des commandes : {e}")
+
+    async def sync_commands(self, guild=None, force: bool = False):
+        """Synchronise les commandes slash seulement si leur empreinte a changé.
+
+        Avec `guild`, les commandes globales sont copiées sur ce serveur (tests).
+        Renvoie le nombre de commandes synchronisées, ou None si rien n'a changé.
+        """
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+
+        key = str(guild.id) if guild is not None else 'global'
+        fingerprint = self.command_tree_fingerprint(guild)
+        hashes = self._load_command_hashes()
+        if not force and hashes.get(key) == fingerprint:
+            return None
+
+        synced = await self.tree.sync(guild=guild)
+        hashes[key] = fingerprint
+        self._save_command_hashes(hashes)
+        return len(synced)
+
+
+# Initialisation du bot
+config = ConfigManager.load()
+intents = discord.Intents.all()
+rpc_config = config.get('rpc', {})
+profiler = StartupProfiler(
+    os.environ.get('SYNTHIA_PROFILE_STARTUP') == '1' or config.get('profile_startup', False),
+    PROCESS_START
+)
+profiler.record('imports', PROCESS_START, IMPORTS_DONE)
+# L'activité est envoyée à chaque IDENTIFY : pas besoin de change_presence après une reconnexion
+bot = SynthiaBot(
+    command_prefix=config['prefix'],
+    intents=intents,
+    activity=build_activity(rpc_config),
+    status=STATUS_TYPES.get(rpc_config.get('status', 'online'), discord.Status.online),
+    startup_profiler=profiler
+)
+
+@bot.event
+async def on_ready():
+    logging.info(f'✅ Connecté en tant que {bot.user} ({bot.user.id})')
+
+    if not bot.startup_profiler.reported:
+        bot.startup_profiler.record('first_ready', PROCESS_START)
+        bot.startup_profiler.report()
 
     # Nettoyage des serveurs quittés
-    config_data["guilds"] = {
-        k: v for k, v in config_data["guilds"].items()
-        if k in current_guilds
-    }
-    ConfigManager.save(config_data)
+    ConfigManager.prune_guilds(g.id for g in bot.guilds)
 
 @bot.event
 async def on_guild_join(guild):
@@ -142,17 +924,34 @@ async def on_guild_join(guild):
 @bot.event
 async def on_guild_remove(guild):
     """Nettoie la configuration d'un serveur quitté"""
-    config = ConfigManager.load()
-    config["guilds"].pop(str(guild.id), None)
-    ConfigManager.save(config)
+    ConfigManager.remove_guild(guild.id)
     logging.info(f"♻ Configuration nettoyée pour {guild.name} ({guild.id})")
 
 @bot.command()
 @commands.is_owner()
-async def sync(ctx):
-    """Synchronise les commandes slash"""
-    synced = await bot.tree.sync()
-    await ctx.send(f"✅ {len(synced)} commandes synchronisées")
+async def reload_config(ctx):
+    """Relit config.json sans redémarrer le bot"""
+    try:
+        ConfigManager.reload()
+    except CONFIG_ERRORS as e:
+        return await ctx.send(f"❌ Configuration illisible, version actuelle conservée : {str(e)[:100]}")
+    await ctx.send("✅ Configuration rechargée")
+
+@bot.command()
+@commands.is_owner()
+async def sync(ctx, scope: str = "global", force: bool = False):
+    """Synchronise les commandes slash si elles ont changé (scope : global ou guild)"""
+    if scope not in ("global", "guild"):
+        return await ctx.send("❌ Portée invalide : `global` ou `guild`")
+
+    synced = await bot.sync_commands(guild=ctx.guild if scope == "guild" else None, force=force)
+    if synced is None:
+        await ctx.send("✅ Commandes déjà à jour (utilisez `force` pour forcer la synchronisation)")
+    else:
+        await ctx.send(f"✅ {synced} commandes synchronisées")
 
 if __name__ == '__main__':
-    bot.run(config['token'])
+    try:
+        bot.run(config['token'])
+    finally:
+        ConfigManager.flush()